@@ -4,3 +4,9 @@ register(
     id='snake-v0',
     entry_point='gym_snake.envs:SnakeEnv',
 )
+
+# the same env with its game hosted by a snake_impl.server.SnakeServer, pass address='host:port' to gym.make
+register(
+    id='snake-remote-v0',
+    entry_point='gym_snake.envs:RemoteSnakeEnv',
+)
@@ -1 +1,4 @@
-from gym_snake.envs.snake_env import SnakeEnv
\ No newline at end of file
+from gym_snake.envs.snake_env import SnakeEnv
+from gym_snake.envs.frame_stack import FrameStack, FrameBuffer, VecFrameStack
+from gym_snake.envs.vec_env import SnakeVecEnv
+from gym_snake.envs.remote_env import RemoteSnakeEnv, RemoteSnakeVecEnv
\ No newline at end of file
@@ -0,0 +1,111 @@
+import gym
+import numpy as np
+from gym import spaces
+
+
+# ring buffer of the last num_frames observations. every frame is written twice, num_frames slots apart, so the
+# newest num_frames frames are always one contiguous slice of the buffer and stacking them is a view, not a copy.
+# with a batch_size every row is its own ring, all advanced together by a batched environment
+class FrameBuffer:
+    def __init__(self, num_frames, frame_shape, dtype=np.float64, batch_size=None):
+        self.num_frames = num_frames
+        self.batch_size = batch_size
+        lead = (2 * num_frames,) if batch_size is None else (batch_size, 2 * num_frames)
+        self.frames = np.zeros(shape=(*lead, *frame_shape), dtype=dtype)
+        self.cursor = 0  # slot the next frame is written to, the stack always starts here
+
+    # fills the whole history with the first frame of an episode. for a batch, rows selects which rows to restart
+    def reset(self, frame, rows=None):
+        if self.batch_size is None:
+            self.frames[:] = frame
+        elif rows is None:
+            self.frames[:] = np.expand_dims(frame, 1)
+        else:
+            self.frames[rows] = np.expand_dims(np.asarray(frame)[rows], 1)
+
+    # appends a frame (or one per row). rows flagged in reset_rows started a new episode with this frame, so their
+    # history is restarted instead of extended
+    def push(self, frame, reset_rows=None):
+        slot = self.cursor
+        if self.batch_size is None:
+            self.frames[slot] = frame
+            self.frames[slot + self.num_frames] = frame
+        else:
+            self.frames[:, slot] = frame
+            self.frames[:, slot + self.num_frames] = frame
+            if reset_rows is not None and np.any(reset_rows):
+                self.reset(frame, rows=np.asarray(reset_rows, dtype=bool))
+        self.cursor = (slot + 1) % self.num_frames
+
+    # oldest frame first. the view is only valid until the next push or reset, ask for a copy to keep it longer
+    def stacked(self, copy=False):
+        window = slice(self.cursor, self.cursor + self.num_frames)
+        view = self.frames[window] if self.batch_size is None else self.frames[:, window]
+        return view.copy() if copy else view
+
+
+def _stacked_space(obs_space, num_frames, dtype):
+    assert isinstance(obs_space, spaces.Box), 'frame stacking needs array observations'
+    return spaces.Box(low=np.min(obs_space.low), high=np.max(obs_space.high), shape=(num_frames, *obs_space.shape),
+                      dtype=dtype)
+
+
+# stacks the last num_frames observations of a SnakeEnv (or any env with array observations) into one observation
+# of shape (num_frames, *obs_shape). observations are views into the ring buffer unless copy is set. frames are
+# stored as the env's observation dtype, or as dtype if given (e.g. the compact dtype a replay memory stores)
+class FrameStack(gym.Wrapper):
+    def __init__(self, env, num_frames, copy=False, dtype=None):
+        super().__init__(env)
+        obs_space = env.observation_space
+        dtype = np.dtype(dtype if dtype is not None else obs_space.dtype)
+        self.copy = copy
+        self.observation_space = _stacked_space(obs_space, num_frames, dtype)
+        self.buffer = FrameBuffer(num_frames, obs_space.shape, dtype=dtype)
+
+    def reset(self, **kwargs):
+        obs = self.env.reset(**kwargs)
+        self.buffer.reset(obs)
+        return self.buffer.stacked(self.copy)
+
+    def step(self, action):
+        obs, reward, done, info = self.env.step(action)
+        self.buffer.push(obs)
+        return self.buffer.stacked(self.copy), reward, done, info
+
+
+# FrameStack for a SnakeVecEnv: one batched ring buffer, every row restarted when its env's episode ends. the vec
+# env resets finished games itself, so the stack of a finished game is rebuilt from its history and its info's
+# 'terminal_observation' and handed out in place of the bare frame
+class VecFrameStack:
+    def __init__(self, venv, num_frames, copy=False, dtype=None):
+        self.venv = venv
+        self.num_frames = num_frames
+        self.copy = copy
+        obs_space = venv.observation_space
+        dtype = np.dtype(dtype if dtype is not None else obs_space.dtype)
+        self.num_envs = venv.num_envs
+        self.action_space = venv.action_space
+        self.observation_space = _stacked_space(obs_space, num_frames, dtype)
+        self.buffer = FrameBuffer(num_frames, obs_space.shape, dtype=dtype, batch_size=venv.num_envs)
+
+    # the safe action masks of the wrapped envs, see SnakeVecEnv
+    @property
+    def action_masks(self):
+        return self.venv.action_masks
+
+    def reset(self):
+        self.buffer.reset(self.venv.reset())
+        return self.buffer.stacked(self.copy)
+
+    def step(self, actions):
+        obs, rewards, dones, infos = self.venv.step(actions)
+        for i in np.flatnonzero(dones):
+            # the newest num_frames - 1 frames of the history, then the frame that ended the episode
+            history = self.buffer.stacked()[i, 1:]
+            infos[i]['terminal_observation'] = np.concatenate(
+                [history, np.expand_dims(infos[i]['terminal_observation'], 0).astype(self.buffer.frames.dtype)])
+        self.buffer.push(obs, reset_rows=dones)
+        return self.buffer.stacked(self.copy), rewards, dones, infos
+
+    def close(self):
+        self.venv.close()
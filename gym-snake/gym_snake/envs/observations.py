@@ -0,0 +1,208 @@
+import numpy as np
+from gym import spaces
+
+# encodings shared by every observation mode
+FOOD_ENCODING = -1
+GRID = 'grid'
+EGOCENTRIC = 'egocentric'
+RAYS = 'rays'
+SPARSE = 'sparse'
+OBSERVATION_MODES = (GRID, EGOCENTRIC, RAYS, SPARSE)
+
+# the 8 ray directions as (right, forward) offsets relative to the heading, clockwise starting straight ahead
+_RAY_DIRECTIONS = np.array([[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]])
+RAY_FEATURES = 3  # wall, body, food
+_local_offsets_cache = {}
+
+
+# the full board, indexed [x, y, channel]. channel 0 is 1 for a segment and -1 for food, channel 1 is the
+# normalized segment index where the head is 1
+def grid_observation(game_state):
+    segs = game_state.segments
+    snake_len = len(segs)
+    obs = np.zeros(shape=(game_state.width, game_state.height, 2))
+    for i, seg in enumerate(segs):
+        seg_tuple = tuple(seg)
+        obs[(*seg_tuple, 0)] = 1
+        obs[(*seg_tuple, 1)] = 1 - (i / snake_len)
+
+    if game_state.food_pos is not None:
+        obs[(*tuple(game_state.food_pos), 0)] = FOOD_ENCODING
+
+    return obs
+
+
+# unit vectors of the snake's frame of reference in board coordinates. forward is the heading and right is
+# the heading turned clockwise (y points down on the board)
+def heading_axes(game_state):
+    forward = np.asarray(game_state.dir)
+    right = np.array([-forward[1], forward[0]])
+    return forward, right
+
+
+# (x, y) offsets of every cell in a view_size x view_size crop, indexed [col, row] in the snake's frame with the
+# head in the middle and forward pointing towards row 0
+def _local_offsets(view_size):
+    if view_size not in _local_offsets_cache:
+        radius = view_size // 2
+        span = np.arange(-radius, radius + 1)
+        cols, rows = np.meshgrid(span, span, indexing='ij')
+        _local_offsets_cache[view_size] = (cols, rows)
+    return _local_offsets_cache[view_size]
+
+
+# converts board cells (n, 2) to the snake's local (right, backward) coordinates relative to the head
+def _to_local(cells, head, forward, right):
+    rel = cells - head
+    return rel @ right, -(rel @ forward)
+
+
+# a view_size x view_size crop around the head, rotated so the snake always faces up. channels are the same as the
+# grid observation plus a third channel that is 1 for cells outside of the board
+def egocentric_observation(game_state, view_size=7):
+    assert view_size % 2 == 1, 'egocentric view size must be odd so the head sits in the middle'
+    radius = view_size // 2
+    forward, right = heading_axes(game_state)
+    segs = np.asarray(game_state.segments)
+    head = segs[0]
+    obs = np.zeros(shape=(view_size, view_size, 3))
+
+    # walls: rotate the crop's cell offsets onto the board and mark anything that falls off it
+    cols, rows = _local_offsets(view_size)
+    board_x = head[0] + cols * right[0] - rows * forward[0]
+    board_y = head[1] + cols * right[1] - rows * forward[1]
+    obs[..., 2] = (board_x < 0) | (board_x >= game_state.width) | (board_y < 0) | (board_y >= game_state.height)
+
+    # body: only the segments that land inside the crop are written
+    local_x, local_y = _to_local(segs, head, forward, right)
+    visible = (np.abs(local_x) <= radius) & (np.abs(local_y) <= radius)
+    order = np.flatnonzero(visible)
+    obs[local_x[visible] + radius, local_y[visible] + radius, 0] = 1
+    obs[local_x[visible] + radius, local_y[visible] + radius, 1] = 1 - order / len(segs)
+
+    if game_state.food_pos is not None:
+        food_x, food_y = _to_local(np.asarray(game_state.food_pos)[None], head, forward, right)
+        if abs(food_x[0]) <= radius and abs(food_y[0]) <= radius:
+            obs[food_x[0] + radius, food_y[0] + radius, 0] = FOOD_ENCODING
+
+    return obs
+
+
+# steps along each (n, 2) direction until cells (m, 2) are hit, inf where a cell is not on that ray
+def _ray_hits(directions, rel_cells):
+    # distance along the ray, the non-zero component of the direction is always +-1
+    t = np.where(directions[:, None, 0] != 0, rel_cells[None, :, 0] * directions[:, None, 0],
+                 rel_cells[None, :, 1] * directions[:, None, 1])
+    on_ray = (t > 0) & (rel_cells[None, :, 0] == t * directions[:, None, 0]) \
+        & (rel_cells[None, :, 1] == t * directions[:, None, 1])
+    return np.where(on_ray, t, np.inf).min(axis=1, initial=np.inf)
+
+
+# 8 rays cast from the head relative to the heading (forward first, then clockwise). for each ray the inverse
+# distance to the wall, the nearest body segment and the food is reported, 0 meaning nothing on that ray
+def ray_observation(game_state):
+    forward, right = heading_axes(game_state)
+    directions = _RAY_DIRECTIONS[:, :1] * right + _RAY_DIRECTIONS[:, 1:] * forward
+    segs = np.asarray(game_state.segments)
+    head = segs[0]
+
+    # number of steps until the ray leaves the board, the first cell outside counts as the wall
+    limits = np.array([game_state.width, game_state.height])
+    to_edge = np.where(directions > 0, limits - 1 - head, np.where(directions < 0, head, np.inf))
+    wall = to_edge.min(axis=1) + 1
+
+    body = _ray_hits(directions, segs[1:] - head)
+    if game_state.food_pos is not None:
+        food = _ray_hits(directions, np.asarray(game_state.food_pos)[None] - head)
+    else:
+        food = np.full(len(directions), np.inf)
+
+    return 1 / np.stack([wall, body, food], axis=1).reshape(-1)
+
+
+# the snake and food as small integer arrays instead of a board. segments is (n, 2) ordered head first, order holds
+# each segment's index along the body and food is (-1, -1) once the board is full
+def sparse_observation(game_state):
+    segments = np.array(game_state.segments, dtype=np.int16).reshape(-1, 2)
+    order = np.arange(len(segments), dtype=np.int32)
+    food = np.array(game_state.food_pos if game_state.food_pos is not None else (-1, -1), dtype=np.int16)
+    return {'segments': segments, 'order': order, 'food': food}
+
+
+# stands in for a missing frame, e.g. padding before the start of an episode
+EMPTY_SPARSE = {'segments': np.zeros((0, 2), dtype=np.int16), 'order': np.zeros(0, dtype=np.int32),
+                'food': np.array([-1, -1], dtype=np.int16)}
+
+
+# turns a minibatch of sparse observations into the (batch, width, height, 2) grid encoding in one scatter, so the
+# dense board only ever exists for the samples a learner actually trains on
+def densify_batch(sparse_batch, width, height, dtype=np.float32):
+    batch_size = len(sparse_batch)
+    out = np.zeros(shape=(batch_size, width, height, 2), dtype=dtype)
+    if batch_size == 0:
+        return out
+
+    lengths = np.array([len(obs['segments']) for obs in sparse_batch])
+    segments = np.concatenate([obs['segments'] for obs in sparse_batch]).astype(np.intp)
+    order = np.concatenate([obs['order'] for obs in sparse_batch])
+    batch_idx = np.repeat(np.arange(batch_size), lengths)
+    out[batch_idx, segments[:, 0], segments[:, 1], 0] = 1
+    out[batch_idx, segments[:, 0], segments[:, 1], 1] = 1 - order / lengths[batch_idx]
+
+    food = np.stack([obs['food'] for obs in sparse_batch]).astype(np.intp)
+    has_food = food[:, 0] >= 0
+    out[np.flatnonzero(has_food), food[has_food, 0], food[has_food, 1], 0] = FOOD_ENCODING
+    return out
+
+
+def observation_shape(mode, width, height, view_size=7):
+    if mode == GRID:
+        return width, height, 2
+    elif mode == EGOCENTRIC:
+        return view_size, view_size, 3
+    elif mode == RAYS:
+        return len(_RAY_DIRECTIONS) * RAY_FEATURES,
+    elif mode == SPARSE:
+        return width, height, 2  # once densified, see sparse_observation_space for the raw arrays
+    raise ValueError('Unknown observation mode: ' + str(mode))
+
+
+# arrays of min_rows to max_rows rows of shape row_shape, every element between low and high (scalars, or arrays of
+# row_shape). Box only describes fixed shapes, the sparse observations are as long as the snake
+class RaggedBox(spaces.Space):
+    def __init__(self, low, high, row_shape, min_rows, max_rows, dtype, seed=None):
+        super().__init__(shape=None, dtype=dtype, seed=seed)
+        self.row_shape = tuple(row_shape)
+        self.low = np.broadcast_to(np.asarray(low, dtype=dtype), self.row_shape)
+        self.high = np.broadcast_to(np.asarray(high, dtype=dtype), self.row_shape)
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+
+    def sample(self, mask=None):
+        rows = self.np_random.integers(self.min_rows, self.max_rows + 1)
+        return self.np_random.integers(self.low, self.high.astype(np.int64) + 1,
+                                       size=(rows, *self.row_shape)).astype(self.dtype)
+
+    def contains(self, x):
+        x = np.asarray(x)
+        return x.shape[1:] == self.row_shape and self.min_rows <= len(x) <= self.max_rows \
+            and np.can_cast(x.dtype, self.dtype) and bool(np.all(x >= self.low) and np.all(x <= self.high))
+
+    def __repr__(self):
+        return 'RaggedBox(%d..%d, %s, %s)' % (self.min_rows, self.max_rows, self.row_shape, self.dtype)
+
+    def __eq__(self, other):
+        return isinstance(other, RaggedBox) and self.row_shape == other.row_shape and self.dtype == other.dtype \
+            and (self.min_rows, self.max_rows) == (other.min_rows, other.max_rows) \
+            and np.array_equal(self.low, other.low) and np.array_equal(self.high, other.high)
+
+
+# the sparse observation as the env emits it: one (x, y) row and one order entry per segment
+def sparse_observation_space(width, height):
+    cells = width * height
+    return spaces.Dict({
+        'segments': RaggedBox(low=0, high=[width - 1, height - 1], row_shape=(2,), min_rows=1, max_rows=cells,
+                              dtype=np.int16),
+        'order': RaggedBox(low=0, high=cells - 1, row_shape=(), min_rows=1, max_rows=cells, dtype=np.int32),
+        'food': spaces.Box(low=-1, high=np.array([width - 1, height - 1]), shape=(2,), dtype=np.int16),
+    })
@@ -0,0 +1,108 @@
+import numpy as np
+
+from snake_impl.config import Config as GameConfig
+from snake_impl.server import SnakeClient, RemoteSnake, parse_address
+from gym_snake.envs.snake_env import SnakeEnv
+from gym_snake.envs.vec_env import SnakeVecEnv
+
+
+def _client_for(address, client):
+    if client is not None:
+        return client
+    return SnakeClient(parse_address(address) if isinstance(address, str) and ':' in address else address)
+
+
+def _board(board_shape):
+    if board_shape is None:
+        return GameConfig.gameplay.board.width, GameConfig.gameplay.board.height
+    return board_shape[0], board_shape[1]
+
+
+# a SnakeEnv whose game runs on a SnakeServer (see snake_impl.server), one round trip per step. address is
+# 'host:port', 'unix:/path' or anything protocol.connect takes. pass a client to share its connection pool
+class RemoteSnakeEnv(SnakeEnv):
+    def __init__(self, address='localhost:5555', client=None, game_id=None, **env_args):
+        self.client = _client_for(address, client)
+        self.owns_client = client is None
+        self.game_id = game_id
+        env_args.pop('show', None)  # there's nothing to show, the game lives on the server
+        env_args.pop('headless', None)
+        super().__init__(show=False, headless=True, **env_args)
+
+    def make_headless_engine(self, engine_args):
+        width = engine_args.get('width', GameConfig.gameplay.board.width)
+        height = engine_args.get('height', GameConfig.gameplay.board.height)
+        return RemoteSnake(self.client, width, height, engine_args['max_ticks'], engine_args['starvation_factor'],
+                           game_id=self.game_id)
+
+    # the seed and actions stay on the server, a snapshot doesn't carry them, so the log is fetched from there
+    def episode_log(self):
+        return self.snake.episode_log()
+
+    def close(self):
+        if self.snake is None:
+            return
+        self.snake.close()
+        self.snake = None
+        if self.owns_client:
+            self.client.close()
+
+
+# num_envs games on one server, stepped (and reset) together with a single round trip per step
+class RemoteSnakeVecEnv(SnakeVecEnv):
+    def __init__(self, num_envs, address='localhost:5555', client=None, **env_args):
+        self.client = _client_for(address, client)
+        self.owns_client = client is None
+        self.width, self.height = _board(env_args.get('board_shape'))
+        game_ids = self.client.create(num_envs, self.width, self.height,
+                                      env_args.get('max_ticks', GameConfig.gameplay.truncation.max_ticks),
+                                      env_args.get('starvation_factor',
+                                                   GameConfig.gameplay.truncation.starvation_area_factor))
+        self.game_ids = game_ids
+        self.setup([RemoteSnakeEnv(client=self.client, game_id=game_id, **env_args) for game_id in game_ids])
+
+    def reset(self):
+        states = self.client.reset(self.game_ids, self.width, self.height)
+        obs = []
+        for i, (env, state) in enumerate(zip(self.envs, states)):
+            obs.append(self._start(env, state))
+            self.action_masks[i] = env.action_mask()
+        return self._batch(obs)
+
+    def step(self, actions):
+        states = self.client.step(self.game_ids, actions, self.width, self.height)
+        obs, infos = [], []
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        for i, (env, state) in enumerate(zip(self.envs, states)):
+            env.snake.update(state)
+            ob, rewards[i], dones[i], info = env.transition(state)
+            self.action_masks[i] = info['action_mask']
+            obs.append(ob)
+            infos.append(info)
+
+        # every finished game is restarted in one more round trip
+        finished = np.flatnonzero(dones)
+        if len(finished):
+            new_states = self.client.reset([self.game_ids[i] for i in finished], self.width, self.height)
+            for i, state in zip(finished, new_states):
+                infos[i]['terminal_observation'] = obs[i]
+                obs[i] = self._start(self.envs[i], state)
+                self.action_masks[i] = self.envs[i].action_mask()
+        return self._batch(obs), rewards, dones, infos
+
+    @staticmethod
+    def _start(env, state):
+        env.snake.update(state)
+        env.run_before = True
+        return env.start_episode(state)
+
+    def close(self):
+        if self.envs is None:
+            return
+        self.client.close_games(self.game_ids)
+        for env in self.envs:  # their games are gone already
+            env.snake = None
+        self.envs = None
+        if self.owns_client:
+            self.client.close()
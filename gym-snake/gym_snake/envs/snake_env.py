@@ -3,58 +3,108 @@ from gym import error, spaces, utils
 import numpy as np
 import math
 from gym.utils import seeding
-from snake_impl import Snake
+from snake_impl import Snake, HeadlessSnake
 from snake_impl.config import Config as GameConfig
 import snake_impl.messages.message as msg
+import gym_snake.envs.observations as observations
+from snake_impl.replay import EpisodeLog
 
 
-# no info for you
-class SnakeInfo(object):
+# per-step info. keras-rl adds up whatever items() returns over its logging interval, so only numbers are listed
+# there (and not the state hash, adding those up means nothing). everything else can still be looked up by key
+class SnakeInfo(dict):
+    not_logged = {'state_hash'}
+
     def items(self):
-        return {}
+        return [(key, value) for key, value in super().items()
+                if np.isscalar(value) and not isinstance(value, str) and key not in self.not_logged]
 
 
 class SnakeEnv(gym.Env):
     metadata = {'render.modes': ['rgb_array', 'human']}
 
-    food_encoding = -1
+    food_encoding = observations.FOOD_ENCODING
     # uses default reward space of (-inf, inf) float
     _action_set = [msg.Move.LEFT, msg.Move.RIGHT, msg.Move.UP, msg.Move.DOWN]
     action_space = spaces.Discrete(len(_action_set))
-    empty_info = SnakeInfo()
     # observation space question: how to encode a possible (nxn) where each cell is {-1 (food), 0 (empty),
     # x = [0 OR 1 OR ... food_growth - 1 OR food_growth], x + 1, ... x + len(snake) - 1]}? is it necessary here?
 
     # if board shape is None, default to whatever the snake game impl picks
-    def __init__(self, show=True, time_penalty=0.2, loss_penalty=50, board_shape=None):
-        if board_shape is not None:
-            self.snake = Snake(intermediate=True, out_view=show, width=board_shape[0], height=board_shape[1])
+    # obs_mode is one of observations.OBSERVATION_MODES, view_size is only used by the egocentric mode
+    # headless steps the game directly on the calling thread, which is much faster but can't show a view
+    # max_ticks and starvation_factor cut episodes short in the engine (see GameController), reported as truncated
+    # pool is an EnginePool to take the engine from (and give it back to on close) instead of starting a new one
+    def __init__(self, show=True, time_penalty=0.2, loss_penalty=50, board_shape=None,
+                 obs_mode=observations.GRID, view_size=7, headless=False,
+                 max_ticks=GameConfig.gameplay.truncation.max_ticks,
+                 starvation_factor=GameConfig.gameplay.truncation.starvation_area_factor, pool=None):
+        self.headless = headless
+        self.pool = pool
+        self.max_ticks = max_ticks
+        self.starvation_factor = starvation_factor
+        engine_args = {'width': board_shape[0], 'height': board_shape[1]} if board_shape is not None else {}
+        engine_args.update(max_ticks=max_ticks, starvation_factor=starvation_factor)
+        if headless:
+            self.snake = self.make_headless_engine(engine_args)
+            self.new_state_queue = self.update_view_queue = self.send_action_queue = None
+        elif pool is not None:
+            self.snake = pool.acquire(intermediate=True, out_view=show, **engine_args)
         else:
-            self.snake = Snake(intermediate=True, out_view=show)
-        self.snake.start()
+            self.snake = Snake(intermediate=True, out_view=show, **engine_args)
+            self.snake.start()
+        if not headless:
+            self.new_state_queue = self.snake.v_int_queue
+            self.update_view_queue = self.snake.v_out_queue
+            self.send_action_queue = self.snake.c_queue
         self.run_before = False
-        self.new_state_queue = self.snake.v_int_queue
-        self.update_view_queue = self.snake.v_out_queue
-        self.send_action_queue = self.snake.c_queue
         self.previous_score = 0
-        self.observation_space = spaces.Box(low=-math.inf, high=math.inf, shape=board_shape, dtype=np.int)
+        self.obs_mode = obs_mode
+        self.view_size = view_size
+        if obs_mode == observations.SPARSE:
+            self.observation_space = observations.sparse_observation_space(self.snake.game_width,
+                                                                           self.snake.game_height)
+        else:
+            obs_shape = observations.observation_shape(obs_mode, self.snake.game_width, self.snake.game_height,
+                                                       view_size)
+            # the segment order channel and the ray distances are fractions
+            self.observation_space = spaces.Box(low=-math.inf, high=math.inf, shape=obs_shape, dtype=np.float64)
         self.game_over = False
         self.time_penalty = time_penalty  # penalty per tick (step)
         self.loss_penalty = loss_penalty  # penalty if it hits a wall or itself
         self.last_obs = None
+        self.last_state = None
+
+    # anything with HeadlessSnake's game_width, game_height, game, reset() and step(direction)
+    def make_headless_engine(self, engine_args):
+        if self.pool is not None:
+            return self.pool.acquire(headless=True, **engine_args)
+        return HeadlessSnake(**engine_args)
 
     # action is 0 1 2 or 3 corresponding to either left right up or down
     def step(self, action):
         next_move_msg = SnakeEnv._action_set[action]()  # ignore warning, it's a discrete int
-        self.send_action_queue.put(next_move_msg)  # put the message into the controller
+        if self.headless:
+            game_state = self.snake.step(next_move_msg.dir_array)
+        else:
+            self.send_action_queue.put(next_move_msg)  # put the message into the controller
 
-        next_update = self.get_and_forward_state()
-        game_state = next_update.payload
+            next_update = self.get_and_forward_state()
+            game_state = next_update.payload
 
+        return self.transition(game_state)
+
+    # the gym step result for the engine's state after a step, however that state was obtained
+    def transition(self, game_state):
         obs = self.process_game_state(game_state)
         done = game_state.ended()
         reward = game_state.score - self.previous_score - self.time_penalty
-        info = self.empty_info
+        info = SnakeInfo(truncated=game_state.truncated(), truncation_reason=game_state.truncation_reason)
+        info['TimeLimit.truncated'] = info['truncated']  # the key gym's TimeLimit wrapper uses
+        # actions that are neither reversals nor instant deaths next step, in action_space order
+        info['action_mask'] = game_state.action_mask()
+        info['legal_actions'] = game_state.action_mask(safe=False)
+        info['state_hash'] = game_state.state_hash  # see Game, equal hashes mean equal boards
 
         if done and game_state.lost():
             reward -= self.loss_penalty
@@ -64,24 +114,30 @@ class SnakeEnv(gym.Env):
 
         self.last_obs = obs
 
-        return np.copy(obs), reward, done, info
+        return self.copy_observation(obs), reward, done, info
 
     def reset(self):
+        if self.headless:
+            game_state = self.snake.reset() if self.run_before else self.snake.game
+            self.run_before = True
+            return self.start_episode(game_state)
+
         if self.run_before:  # at least one game has been started
             self.previous_score = 0
             self.send_action_queue.put(msg.GameAction.RESTART())
-            while not self.send_action_queue.empty():  # should REALLY be using task_done and join instead, but o well
-                pass
+            self.send_action_queue.join()  # the controller marks every message it handled (or dropped) as done
         else:
             self.run_before = True
 
         # get the visual of the first game frame,
         update_msg = self.get_and_forward_state()
-        processed_state = self.process_game_state(update_msg.payload)
-
-        self.last_obs = processed_state
+        return self.start_episode(update_msg.payload)
 
-        return np.copy(processed_state)
+    # the first observation of the episode game_state begins
+    def start_episode(self, game_state):
+        self.previous_score = 0
+        self.last_obs = self.process_game_state(game_state)
+        return self.copy_observation(self.last_obs)
 
     def render(self, mode='rgb_array', close=False):
         if mode == 'rgb_array':
@@ -91,13 +147,14 @@ class SnakeEnv(gym.Env):
             gh = self.snake.game_height
             drawing_width = ((cell_width + line_width) * gw) + line_width
             drawing_height = ((cell_width + line_width) * gh) + line_width
-            num_seg = np.count_nonzero(self.last_obs >= 1)
+            grid = self.last_obs if self.obs_mode == observations.GRID else observations.grid_observation(self.last_state)
+            num_seg = np.count_nonzero(grid[..., 0] >= 1)
             out = np.ones(shape=(drawing_width, drawing_height, 3))
             min_green = 0  # used to gradient the snake across blue shades
             max_green = 100
             for row in range(gh):
                 for col in range(gw):
-                    value = self.last_obs[col, row]
+                    value = grid[col, row, 0]
                     if value == SnakeEnv.food_encoding:
                         color = [255, 0, 0]
                     elif value == 0:
@@ -111,41 +168,56 @@ class SnakeEnv(gym.Env):
             return out
 
     def process_game_state(self, game_state):
-        width = game_state.width
-        height = game_state.height
-        food = game_state.food_pos
-        segs = game_state.segments
-        buffer_inc = game_state.growth_queued  # number of growths buffered, so must be incremented to time alive
-        snake_len = len(segs)
-
         self.game_over = game_state.ended()
-
-        obs = np.zeros(shape=(width, height, 2))
-        # note, index 0 is the head of the snake
-        for i, seg in enumerate(segs):
-            # put the amount of time each cell will be "turned on" in the matrix, head max number
-            # obs[tuple(seg)] = (snake_len - i) + buffer_inc
-
-            # put just the index and growth in, head will always be lowest
-            # obs[tuple(seg)] = i + buffer_inc + 1
-
-            # make the first channel of segments always 1, the second channel is the normalized index where head = 1
-            seg_tuple = tuple(seg)
-            obs[(*seg_tuple, 0)] = 1
-            obs[(*seg_tuple, 1)] = 1 - (i / snake_len)
-
-        obs[(*tuple(food), 0)] = SnakeEnv.food_encoding
-
-        return obs
+        self.last_state = game_state
+
+        if self.obs_mode == observations.EGOCENTRIC:
+            return observations.egocentric_observation(game_state, self.view_size)
+        elif self.obs_mode == observations.RAYS:
+            return observations.ray_observation(game_state)
+        elif self.obs_mode == observations.SPARSE:
+            return observations.sparse_observation(game_state)
+        return observations.grid_observation(game_state)
+
+    # the dense arrays are kept around for rendering so the caller gets its own copy. sparse observations are built
+    # fresh every step and are never written to again, so they are handed out as is
+    def copy_observation(self, obs):
+        if self.obs_mode == observations.SPARSE:
+            return obs
+        return np.copy(obs)
+
+    # seed and actions of the current (or just finished) episode, enough to replay it with snake_impl.replay
+    def episode_log(self):
+        return EpisodeLog.from_game(self.last_state, self.max_ticks, self.starvation_factor)
+
+    # mask over the actions for the current state, see Game.action_mask
+    def action_mask(self, safe=True):
+        return self.last_state.action_mask(safe)
 
     def get_and_forward_state(self):
         new_state = self.new_state_queue.get(block=True)  # wait for an update
-        # forward the update to the gui (if there is one)
+        # forward the update to the gui (if there is one). that's a LatestMailbox, so this never waits on the gui and
+        # states the gui is too slow to draw are skipped
         if self.update_view_queue is not None:
             self.update_view_queue.put(new_state)
         return new_state
 
+    # hands the engine back to the pool, or stops it (and its thread, event loop and gui) if it isn't pooled.
+    # the env can't be used afterwards, closing it again does nothing
+    def close(self):
+        if self.snake is None:
+            return
+        if self.pool is not None:
+            self.pool.release(self.snake)
+        elif not self.headless:
+            self.snake.stop()
+        self.snake = None
+        self.new_state_queue = self.update_view_queue = self.send_action_queue = None
+
     def enable_view(self):
+        if self.headless:
+            print('Headless snake environments have no view to enable')
+            return
         self.update_view_queue = self.snake.create_gui()
         self.human_visible_speed()
 
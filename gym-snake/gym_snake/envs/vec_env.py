@@ -0,0 +1,54 @@
+import numpy as np
+
+from gym_snake.envs.snake_env import SnakeEnv
+import gym_snake.envs.observations as observations
+
+
+# steps num_envs SnakeEnvs in lockstep (headless by default) and returns everything batched. finished games are reset
+# right away, the observation that ended them is kept in that env's info as 'terminal_observation'.
+# action_masks holds the safe action mask of every env for the current observations, updated in place each step so
+# a masked policy never has to ask the envs for them
+class SnakeVecEnv:
+    def __init__(self, num_envs, headless=True, **env_args):
+        self.setup([SnakeEnv(headless=headless, **env_args) for _ in range(num_envs)])
+
+    def setup(self, envs):
+        self.envs = envs
+        self.num_envs = len(envs)
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self.sparse = self.envs[0].obs_mode == observations.SPARSE
+        self.action_masks = np.ones((self.num_envs, self.action_space.n), dtype=bool)
+
+    def reset(self):
+        obs = [env.reset() for env in self.envs]
+        for i, env in enumerate(self.envs):
+            self.action_masks[i] = env.action_mask()
+        return self._batch(obs)
+
+    def step(self, actions):
+        obs, infos = [], []
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            ob, rewards[i], dones[i], info = env.step(int(action))
+            if dones[i]:
+                info['terminal_observation'] = ob
+                ob = env.reset()
+                self.action_masks[i] = env.action_mask()
+            else:  # transition() already worked it out for this state
+                self.action_masks[i] = info['action_mask']
+            obs.append(ob)
+            infos.append(info)
+        return self._batch(obs), rewards, dones, infos
+
+    # sparse observations have a different length per env so they stay a list
+    def _batch(self, obs):
+        return obs if self.sparse else np.stack(obs)
+
+    def close(self):
+        if self.envs is None:
+            return
+        for env in self.envs:
+            env.close()
+        self.envs = None
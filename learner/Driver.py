@@ -3,9 +3,10 @@ import argparse
 
 import gym
 import gym_snake  # though 'unused', registers itself with gym once imported
+from gym_snake.envs import observations, FrameStack
 
 from keras.models import Sequential
-from keras.layers import Dense, Flatten, Conv2D, Conv3D, Permute, Dropout
+from keras.layers import Dense, Flatten, Conv2D, Conv3D, Permute, Dropout, InputLayer, Reshape
 from keras.optimizers import RMSprop
 import keras.backend as K
 
@@ -13,11 +14,16 @@ from rl.agents.dqn import DQNAgent
 from rl.core import Processor
 from rl.policy import LinearAnnealedPolicy, EpsGreedyQPolicy
 from rl.memory import SequentialMemory
-from rl.callbacks import ModelIntervalCheckpoint
 
 import numpy as np
 import matplotlib.pyplot as plt
 
+from metrics import MetricsLogger, plot_metrics
+from demonstrations import prefill_memory
+from checkpoint import AsyncCheckpointWriter, AsyncModelCheckpoint, load_checkpoint, load_agent_weights
+from profiling import StageProfiler, StackSampler, ProfilingCallback, instrument_agent
+from prioritized_memory import PrioritizedMemory, PrioritizedDQNAgent
+
 IMAGE_DEPTH = 2
 LOSS_PENALTY = 1
 WINDOW_LENGTH = 4
@@ -25,6 +31,8 @@ BATCH_SIZE = 32
 MAX_EPISODE_STEPS = 100
 TIME_PENALTY = 1 / MAX_EPISODE_STEPS
 ENV_NAME = 'snake-v0'
+CHECKPOINT_INTERVAL = 100000
+CHECKPOINTS_KEPT = 5
 
 # agent parameters
 GAMMA = 0.9
@@ -39,20 +47,43 @@ LEARNING_RATE = 0.00025
 
 
 class SnakeProcessor(Processor):
+    # ray observations are fractional, so they can't be squeezed into integers like the board observations.
+    # sparse observations are stored as is and only densified per minibatch, which needs the board size
+    def __init__(self, obs_dtype='int16', sparse_board=None):
+        self.obs_dtype = obs_dtype
+        self.sparse_board = sparse_board
+
     def process_observation(self, observation):
-        return observation.astype('int16')  # saves storage in experience memory
+        if self.sparse_board is not None:
+            return SparseFrame(observation)
+        return observation.astype(self.obs_dtype)  # saves storage in experience memory
+
+    def process_state_batch(self, batch):
+        if self.sparse_board is None:
+            return batch
+        frames = [SparseFrame.unwrap(frame) for frame in batch.reshape(-1)]
+        dense = observations.densify_batch(frames, *self.sparse_board)
+        return dense.reshape(*batch.shape, *dense.shape[1:])
 
     def process_reward(self, reward):
         return np.clip(reward, -1.0, 1.0)
 
 
-# precondition: len(data) >= window_size
-def avg(data, window_size):
-    assert len(data) >= window_size
-    out = []
-    for i in range(len(data) - window_size + 1):
-        out.append(sum(data[i:i+window_size]) / window_size)
-    return out
+# opaque holder for sparse observations in the replay memory. keras-rl treats anything iterable as a nested
+# observation, so a bare dict would get picked apart when it zero-pads a window
+class SparseFrame(object):
+    __slots__ = ('obs',)
+
+    def __init__(self, obs):
+        self.obs = obs
+
+    # the sparse observation a frame of a sampled window holds. SequentialMemory copies state1's frames with np.copy,
+    # which wraps a SparseFrame in a 0-d object array, and pads windows that cross an episode start with zeroes
+    @staticmethod
+    def unwrap(frame):
+        if getattr(frame, 'shape', None) == ():
+            frame = frame.item()
+        return frame.obs if isinstance(frame, SparseFrame) else observations.EMPTY_SPARSE
 
 
 def main():
@@ -64,20 +95,57 @@ def main():
     parser.add_argument('--showtraining', type=bool, default=False)
     parser.add_argument('--showtesting', type=bool, default=True)
     parser.add_argument('--testeps', type=int, default=20)
+    parser.add_argument('--obs', choices=observations.OBSERVATION_MODES, default=observations.GRID)
+    parser.add_argument('--viewsize', type=int, default=7)
+    parser.add_argument('--envstack', action='store_true', help='stack frames in the env instead of in the memory')
+    parser.add_argument('--metrics', type=str, default='dqn_{}_metrics.jsonl'.format(ENV_NAME),
+                        help='per-episode metrics stream written during training, .jsonl or .csv')
+    parser.add_argument('--resume', type=str, default=None,
+                        help='checkpoint to continue training from, appending to its metrics stream. the replay '
+                             'memory is only restored if the checkpoint was written with --checkpointmemory, '
+                             'otherwise it starts empty and the agent warms up again, so the run diverges from an '
+                             'uninterrupted one. the episode in progress at the checkpoint is not resumed either')
+    parser.add_argument('--checkpointmemory', action='store_true',
+                        help='include the replay memory in checkpoints so --resume picks up exactly where it left '
+                             'off. every checkpoint then copies the whole memory, in RAM and on disk')
+    parser.add_argument('--starvation', type=float, default=None,
+                        help='end episodes after this many board areas worth of ticks without eating')
+    parser.add_argument('--demosteps', type=int, default=0,
+                        help='steps of scripted expert play to prefill the replay memory with before training')
+    parser.add_argument('--profile', type=int, default=None, metavar='STEPS',
+                        help='train for this many steps with every stage timed, report where the time went and exit')
+    parser.add_argument('--profilestacks', type=str, default='dqn_{}_profile.folded'.format(ENV_NAME),
+                        help='where --profile writes the sampled stacks, in the collapsed format flamegraphs use')
+    parser.add_argument('--per', action='store_true',
+                        help='sample the replay memory by TD error (prioritized experience replay)')
 
     args = parser.parse_args()
+    if args.envstack and args.obs == observations.SPARSE:
+        parser.error('sparse observations are stacked by the replay memory, --envstack needs array observations')
 
     print('Running Snake RL driver with args:', args)
 
     board_shape = (args.width, args.height, IMAGE_DEPTH)
 
     # Get the environment and extract the number of actions.
-    env = gym.make(ENV_NAME, show=args.showtraining if args.mode == 'train' else args.showtesting,
-                   board_shape=board_shape, loss_penalty=LOSS_PENALTY, time_penalty=TIME_PENALTY)
+    env_args = dict(board_shape=board_shape, loss_penalty=LOSS_PENALTY, time_penalty=TIME_PENALTY,
+                    obs_mode=args.obs, view_size=args.viewsize, starvation_factor=args.starvation)
+    env = gym.make(ENV_NAME, show=args.showtraining if args.mode == 'train' else args.showtesting, **env_args)
     nb_actions = env.action_space.n
 
     # Model based on those in the Keras-RL examples, which are themselves based on Mnih et al's Atari RL paper (2015)
-    input_shape = (WINDOW_LENGTH, *board_shape)
+    input_shape = (WINDOW_LENGTH, *observations.observation_shape(args.obs, args.width, args.height, args.viewsize))
+    memory_window = WINDOW_LENGTH
+    # the dtype observations are stored as in the replay memory
+    obs_dtype = 'float32' if args.obs == observations.RAYS else 'int16'
+    if args.envstack:
+        # the env hands out whole stacks as views into its ring buffer, so the memory keeps a window of one and
+        # keras-rl never has to concatenate frames. the processor's astype makes the copy the memory stores
+        env = FrameStack(env, WINDOW_LENGTH, dtype=obs_dtype)
+        memory_window = 1
+        frame_input = Reshape(input_shape, input_shape=(1, *input_shape))
+    else:
+        frame_input = InputLayer(input_shape=input_shape)
 
     if K.image_data_format() == 'channels_last':
         # (width, height, depth, channels)
@@ -88,87 +156,107 @@ def main():
     else:
         raise RuntimeError('Unknown image_dim_ordering.')
 
-    model = Sequential([
-        Permute(permute_dims, input_shape=input_shape),
-        Conv3D(32, (2, 2, 2), activation='relu'),
-        Conv3D(32, (3, 3, 1), activation='relu'),
-        Flatten(),
-        Dense(64, activation='relu'),
-        Dense(16, activation='relu'),
-        Dropout(0.2),
-        Dense(nb_actions, activation='linear')
-    ])
+    if args.obs == observations.RAYS:
+        # ray features are already a compact vector, no need for convolutions
+        model = Sequential([
+            frame_input,
+            Flatten(),
+            Dense(64, activation='relu'),
+            Dense(16, activation='relu'),
+            Dense(nb_actions, activation='linear')
+        ])
+    else:
+        model = Sequential([
+            frame_input,
+            Permute(permute_dims),
+            Conv3D(32, (2, 2, 2), activation='relu'),
+            Conv3D(32, (3, 3, 1), activation='relu'),
+            Flatten(),
+            Dense(64, activation='relu'),
+            Dense(16, activation='relu'),
+            Dropout(0.2),
+            Dense(nb_actions, activation='linear')
+        ])
 
     print(model.summary())
 
-    processor = SnakeProcessor()
-    memory = SequentialMemory(limit=1000000, window_length=WINDOW_LENGTH)
+    processor = SnakeProcessor(obs_dtype,
+                               sparse_board=(args.width, args.height) if args.obs == observations.SPARSE else None)
+    if args.per:
+        memory = PrioritizedMemory(limit=1000000, window_length=memory_window, beta_steps=MAX_STEPS)
+    else:
+        memory = SequentialMemory(limit=1000000, window_length=memory_window)
     policy = LinearAnnealedPolicy(EpsGreedyQPolicy(), attr='eps', value_max=1.0, value_min=.35, value_test=.05,
                                   nb_steps=1000000)
-    dqn = DQNAgent(model=model, nb_actions=nb_actions, policy=policy, memory=memory, processor=processor,
-                   nb_steps_warmup=WARMUP_STEPS, gamma=GAMMA, target_model_update=TARGET_MODEL_UPDATE,
-                   train_interval=TRAIN_INTERVAL, delta_clip=1., batch_size=BATCH_SIZE, enable_double_dqn=DOUBLE_Q)
+    resume_from = load_checkpoint(args.resume) if args.mode == 'train' and args.resume else None
+    if args.mode == 'train' and args.demosteps > 0 and (resume_from is None or 'memory' not in resume_from):
+        # the expert plays on its own headless env so it doesn't disturb the training env's episode
+        demo_env = gym.make(ENV_NAME, show=False, headless=True, **env_args)
+        if args.envstack:
+            demo_env = FrameStack(demo_env, WINDOW_LENGTH, dtype=obs_dtype)
+        episodes = prefill_memory(memory, demo_env, args.demosteps, processor, MAX_EPISODE_STEPS)
+        demo_env.close()
+        print('Prefilled replay memory with', args.demosteps, 'expert steps over', episodes, 'episodes')
+    # a prefilled memory can be trained on right away
+    warmup_steps = WARMUP_STEPS if args.demosteps == 0 else BATCH_SIZE
+
+    agent_class = PrioritizedDQNAgent if args.per else DQNAgent
+    dqn = agent_class(model=model, nb_actions=nb_actions, policy=policy, memory=memory, processor=processor,
+                      nb_steps_warmup=warmup_steps, gamma=GAMMA, target_model_update=TARGET_MODEL_UPDATE,
+                      train_interval=TRAIN_INTERVAL, delta_clip=1., batch_size=BATCH_SIZE,
+                      enable_double_dqn=DOUBLE_Q)
     dqn.compile(RMSprop(learning_rate=LEARNING_RATE), metrics=['mae'])
 
-    if args.mode == 'train':
-        weights_filename = 'dqn_{}_weights.h5f'.format(ENV_NAME)
-        checkpoint_weights_filename = 'dqn_' + ENV_NAME + '_weights_{step}.h5f'
-        callbacks = [ModelIntervalCheckpoint(checkpoint_weights_filename, interval=100000)]
-        history = dqn.fit(env, callbacks=callbacks, nb_steps=MAX_STEPS, log_interval=10000,
-                          nb_max_episode_steps=MAX_EPISODE_STEPS)
-
-        # After training is done, we save the final weights one more time.
-        dqn.save_weights(weights_filename, overwrite=True)
+    if args.mode == 'train' and args.profile is not None:
+        if args.profile <= warmup_steps:
+            print('Warning: the agent only starts training after', warmup_steps, 'warmup steps')
+        # stacks are only sampled over the second half, once the memory is warm and the agent is training
+        profiler = StageProfiler()
+        instrument_agent(profiler, dqn, env)
+        sample_steps = args.profile // 2
+        sampler = StackSampler()
+        try:
+            dqn.fit(env, callbacks=[ProfilingCallback(profiler, sampler, sample_start=args.profile - sample_steps,
+                                                      sample_steps=sample_steps, stacks_path=args.profilestacks)],
+                    nb_steps=args.profile, log_interval=10000, nb_max_episode_steps=MAX_EPISODE_STEPS)
+        finally:
+            sampler.stop()  # fit only ends callbacks on a clean finish, this puts the switch interval back either way
+            profiler.unwrap_all()
+    elif args.mode == 'train':
+        weights_filename = 'dqn_{}_weights.ckpt'.format(ENV_NAME)
+        checkpoint_weights_filename = 'dqn_' + ENV_NAME + '_weights_{step}.ckpt'
+        # checkpoints (and the final weights) are snapshotted in memory and written by a background thread
+        checkpoint_writer = AsyncCheckpointWriter(keep_last=CHECKPOINTS_KEPT)
+        callbacks = [AsyncModelCheckpoint(checkpoint_writer, checkpoint_weights_filename, interval=CHECKPOINT_INTERVAL,
+                                          final_filepath=weights_filename, resume_from=resume_from,
+                                          include_memory=args.checkpointmemory),
+                     MetricsLogger(args.metrics, append=resume_from is not None)]
+        dqn.fit(env, callbacks=callbacks, nb_steps=MAX_STEPS, log_interval=10000,
+                nb_max_episode_steps=MAX_EPISODE_STEPS)
 
         # turn on the viewability after training if desired
         if args.showtesting and not args.showtraining:
             env.enable_view()
 
-        # Plotting code adapted from https://matplotlib.org/gallery/api/two_scales.html
-        # Plot the per-episode rewards and steps on the same plot
-        fig, ax1 = plt.subplots()
-
-        plt.title('Reward and episode steps versus episode number [smoothed]')
-
-        plot_color = 'tab:blue'
-        plot_slice = slice(0, len(history.epoch), int(len(history.epoch) / 1000))
-        epoch_slice = history.epoch[plot_slice]
-        ep_reward_slice = history.history['episode_reward'][plot_slice]
-        ep_steps_slice = history.history['nb_episode_steps'][plot_slice]
-
-        # average out 10 adjacent data points because data changes wildly from one pt to next but still trends
-        average_window_size = 10
-        avg_epoch_slice = avg(epoch_slice, average_window_size)
-        avg_reward_slice = avg(ep_reward_slice, average_window_size)
-        avg_steps_slice = avg(ep_steps_slice, average_window_size)
-
-        ax1.set_xlabel('Episode')
-        ax1.set_ylabel('Episode reward', color=plot_color)
-        ax1.plot(avg_epoch_slice, avg_reward_slice, color=plot_color)
-        ax1.tick_params(axis='y', labelcolor=plot_color)
-
-        ax2 = ax1.twinx()
-
-        plot_color = 'tab:red'
-        ax2.set_ylabel('Episode steps', color=plot_color)
-        ax2.plot(avg_epoch_slice, avg_steps_slice, color=plot_color)
-        ax2.tick_params(axis='y', labelcolor=plot_color)
-
-        fig.tight_layout()
+        # the stream is read back lazily, the same plot can be made mid-run with `python metrics.py <path>`
+        plot_metrics(args.metrics)
 
         dqn.test(env, nb_episodes=args.testeps,
                  visualize=False)  # gui visualization is enabled via command line args not here
 
+        checkpoint_writer.close()  # make sure the final weights made it to disk
         plt.show()
     elif args.mode == 'test':
         env.human_visible_speed()
-        weights_filename = 'dqn_{}_weights.h5f'.format(ENV_NAME)
+        weights_filename = 'dqn_{}_weights.ckpt'.format(ENV_NAME)
         if args.weights:
             weights_filename = args.weights
-        dqn.load_weights(weights_filename)
+        load_agent_weights(dqn, weights_filename)
         dqn.test(env, nb_episodes=args.testeps,
                  visualize=True)  # gui visualization is enabled via command line args, not here
 
+    env.close()  # stops the engine thread and closes the gui
+
 
 if __name__ == '__main__':
     main()
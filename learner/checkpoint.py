@@ -0,0 +1,223 @@
+import copy
+import os
+import pickle
+import queue
+import random
+import tempfile
+import threading
+from collections import deque
+
+import numpy as np
+import keras.backend as K
+from rl.callbacks import Callback
+
+CHECKPOINT_EXTENSION = '.ckpt'
+
+
+# copies everything needed to pick training back up into host memory. this is the only part that runs on the
+# training thread, the (slow) write happens in AsyncCheckpointWriter. step is the number of steps taken so far,
+# the agent's own counter if not given. the replay memory is only included with include_memory: it is copied
+# whole on every checkpoint, which costs as much memory again and stalls training while the copy is made
+def snapshot_agent(agent, step=None, include_optimizer=True, include_rng=True, include_memory=False):
+    snapshot = {'step': int(agent.step if step is None else step), 'weights': agent.model.get_weights()}
+    if hasattr(agent, 'target_model'):
+        snapshot['target_weights'] = agent.target_model.get_weights()
+    if include_optimizer and hasattr(agent, 'trainable_model'):
+        snapshot['optimizer'] = K.batch_get_value(agent.trainable_model.optimizer.weights)
+    if include_rng:
+        snapshot['rng'] = {'numpy': np.random.get_state(), 'python': random.getstate()}
+    if include_memory:
+        snapshot['memory'] = snapshot_memory(agent.memory)
+    return snapshot
+
+
+# the replay memory's fields, copied so training can keep appending while the writer pickles them. works for
+# keras-rl's SequentialMemory (deques or RingBuffers of transitions) and PrioritizedMemory (arrays and a SumTree).
+# stored observations are never changed in place, so containers of them are copied shallowly
+def snapshot_memory(memory):
+    return {'type': type(memory).__name__, 'fields': _copy_fields(memory)}
+
+
+def _copy_fields(obj):
+    return {name: _copy_value(value) for name, value in vars(obj).items()}
+
+
+def _copy_value(value):
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, deque):
+        return deque(value, maxlen=value.maxlen)
+    if isinstance(value, (list, dict)):
+        return copy.copy(value)
+    if hasattr(value, '__dict__') and not callable(value):  # e.g. a RingBuffer or SumTree
+        copied = copy.copy(value)
+        copied.__dict__ = _copy_fields(value)
+        return copied
+    return value
+
+
+# puts a snapshot_memory copy back into a memory of the same kind and size
+def restore_memory(memory, snapshot):
+    fields = snapshot['fields']
+    if snapshot['type'] != type(memory).__name__ or fields.get('limit') != getattr(memory, 'limit', None):
+        raise ValueError('Checkpoint holds a %s of limit %s, the agent has a %s of limit %s' %
+                         (snapshot['type'], fields.get('limit'), type(memory).__name__,
+                          getattr(memory, 'limit', None)))
+    vars(memory).update(fields)
+
+
+# writes snapshots from a background thread so training never waits on the disk. every file is written to a
+# temporary name and renamed into place, so a crash mid-write never leaves a half written checkpoint behind.
+# only the newest keep_last checkpoints written by this writer are kept
+class AsyncCheckpointWriter:
+    def __init__(self, keep_last=5, max_pending=2):
+        self.keep_last = keep_last
+        self.written = deque()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+
+    # keep_forever checkpoints (e.g. the final weights) don't count towards keep_last
+    def save(self, snapshot, path, keep_forever=False):
+        self._raise_if_failed()
+        self._queue.put((snapshot, path, keep_forever))
+
+    # blocks until everything queued so far is on disk
+    def flush(self):
+        self._queue.join()
+        self._raise_if_failed()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_if_failed()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                snapshot, path, keep_forever = item
+                write_checkpoint(snapshot, path)
+                if not keep_forever:
+                    self._rotate(path)
+            except Exception as e:  # surfaced on the training thread by the next save/flush
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _rotate(self, path):
+        if path in self.written:
+            self.written.remove(path)
+        self.written.append(path)
+        while len(self.written) > self.keep_last:
+            oldest = self.written.popleft()
+            if os.path.exists(oldest):
+                os.remove(oldest)
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Writing a checkpoint failed') from error
+
+
+def write_checkpoint(snapshot, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            pickle.dump(snapshot, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(path):
+    with open(path, 'rb') as checkpoint_file:
+        return pickle.load(checkpoint_file)
+
+
+# restores network weights (and the RNGs if they were saved). the step and optimizer state are restored by
+# AsyncModelCheckpoint since keras-rl resets the step when fit() starts and builds optimizer slots lazily
+def restore_weights(agent, checkpoint):
+    agent.model.set_weights(checkpoint['weights'])
+    if 'target_weights' in checkpoint and hasattr(agent, 'target_model'):
+        agent.target_model.set_weights(checkpoint['target_weights'])
+    if 'rng' in checkpoint:
+        np.random.set_state(checkpoint['rng']['numpy'])
+        random.setstate(checkpoint['rng']['python'])
+
+
+# loads either a checkpoint written here or plain keras weights
+def load_agent_weights(agent, path):
+    if path.endswith(CHECKPOINT_EXTENSION):
+        restore_weights(agent, load_checkpoint(path))
+    else:
+        agent.load_weights(path)
+
+
+# keras-rl callback replacing ModelIntervalCheckpoint. every interval steps the agent is snapshotted in memory and
+# handed to the writer. filepath is formatted with the step, final_filepath (if given) gets the weights at the end.
+# with resume_from the run continues from that checkpoint's step, weights, optimizer state, RNGs and, if it was
+# saved with include_memory, replay memory. without a saved memory it starts out empty, so the agent warms up again
+# (for nb_steps_warmup more steps) before it trains and the run won't match one that was never interrupted. either
+# way the env starts a fresh episode, the one in progress when the checkpoint was taken is not saved
+class AsyncModelCheckpoint(Callback):
+    def __init__(self, writer, filepath, interval, final_filepath=None, resume_from=None, **snapshot_args):
+        super().__init__()
+        self.writer = writer
+        self.filepath = filepath
+        self.interval = interval
+        self.final_filepath = final_filepath
+        self.resume_from = resume_from
+        self.snapshot_args = snapshot_args
+        self._pending_step = None
+        self._pending_optimizer = None
+        self._rewarm = False
+        self.total_steps = 0  # counted here, the agent's step is only incremented after on_step_end
+
+    def on_train_begin(self, logs={}):
+        self.total_steps = 0
+        if self.resume_from is not None:
+            restore_weights(self.model, self.resume_from)
+            if 'memory' in self.resume_from:
+                restore_memory(self.model.memory, self.resume_from['memory'])
+            self._rewarm = 'memory' not in self.resume_from
+            self._pending_step = self.total_steps = self.resume_from['step']
+            self._pending_optimizer = self.resume_from.get('optimizer')
+            self.resume_from = None
+
+    def on_episode_begin(self, episode, logs={}):
+        if self._pending_step is not None:  # fit() zeroes the step right after on_train_begin
+            self.model.step = self._pending_step
+            if self._rewarm:
+                # DQNAgent samples its memory as soon as step passes nb_steps_warmup, which would be right away
+                self.model.nb_steps_warmup += self._pending_step
+            self._pending_step = None
+
+    def on_step_end(self, step, logs={}):
+        if self._pending_optimizer is not None:
+            self._restore_optimizer()
+
+        self.total_steps += 1
+        if self.total_steps % self.interval == 0:
+            filepath = self.filepath.format(step=self.total_steps, **logs)
+            self.writer.save(snapshot_agent(self.model, step=self.total_steps, **self.snapshot_args), filepath)
+
+    def on_train_end(self, logs={}):
+        if self.final_filepath is not None:
+            snapshot_args = dict(self.snapshot_args, include_memory=False)  # just the weights to keep
+            self.writer.save(snapshot_agent(self.model, **snapshot_args), self.final_filepath, keep_forever=True)
+
+    def _restore_optimizer(self):
+        slots = self.model.trainable_model.optimizer.weights
+        if len(slots) == len(self._pending_optimizer):  # slots only exist after the first training batch
+            K.batch_set_value(list(zip(slots, self._pending_optimizer)))
+            self._pending_optimizer = None
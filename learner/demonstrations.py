@@ -0,0 +1,57 @@
+import numpy as np
+
+from snake_impl.expert import ExpertPolicy
+
+# episodes are cut off after this many steps unless told otherwise, far more than the expert needs to fill the board
+# sizes trained on. None as max_episode_steps lets episodes run until the game ends them
+DEFAULT_MAX_EPISODE_STEPS = 10000
+
+
+# plays env with the scripted expert and yields (observation, action, reward, done) for every step, in the same
+# order keras-rl appends them to its memory. observations may be views (e.g. with FrameStack), copy them to keep them.
+# use a headless env, the expert is far faster than the threaded engine can tick
+def demonstrations(env, nb_steps, max_episode_steps=DEFAULT_MAX_EPISODE_STEPS):
+    snake_env = env.unwrapped
+    expert = ExpertPolicy(snake_env.snake.game_width, snake_env.snake.game_height)
+    observation = env.reset()
+    episode_steps = 0
+    for _ in range(nb_steps):
+        action = expert.act(snake_env.last_state)
+        next_observation, reward, done, _ = env.step(action)
+        episode_steps += 1
+        if max_episode_steps is not None and episode_steps >= max_episode_steps:
+            done = True
+        yield observation, action, reward, done
+
+        if done:
+            observation = env.reset()
+            expert.reset()
+            episode_steps = 0
+        else:
+            observation = next_observation
+
+
+# fills a keras-rl memory with expert play, passing everything through the agent's processor like DQNAgent does
+def prefill_memory(memory, env, nb_steps, processor=None, max_episode_steps=DEFAULT_MAX_EPISODE_STEPS):
+    episodes = 0
+    for observation, action, reward, done in demonstrations(env, nb_steps, max_episode_steps):
+        if processor is not None:
+            observation = processor.process_observation(observation)
+            reward = processor.process_reward(reward)
+        else:
+            observation = np.copy(observation)
+        memory.append(observation, action, reward, done, training=True)
+        episodes += done
+    return episodes
+
+
+# saves expert play as a compressed .npz dataset of observations, actions, rewards and dones (array observations only)
+def record_demonstrations(path, env, nb_steps, max_episode_steps=DEFAULT_MAX_EPISODE_STEPS):
+    observations, actions, rewards, dones = [], [], [], []
+    for observation, action, reward, done in demonstrations(env, nb_steps, max_episode_steps):
+        observations.append(np.copy(observation))
+        actions.append(action)
+        rewards.append(reward)
+        dones.append(done)
+    np.savez_compressed(path, observations=np.stack(observations), actions=np.array(actions, dtype=np.int8),
+                        rewards=np.array(rewards, dtype=np.float32), dones=np.array(dones, dtype=bool))
@@ -0,0 +1,280 @@
+import argparse
+import csv
+import json
+import math
+import os
+from time import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+from rl.callbacks import Callback
+
+
+# mean and variance over the last window_size values, updated in O(1) with Welford's method. the values themselves
+# are kept in a fixed ring so the oldest one can be taken back out
+class RollingStats:
+    def __init__(self, window_size):
+        self.window = np.zeros(window_size)
+        self.count = 0
+        self.index = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        size = len(self.window)
+        if self.count < size:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+        else:  # swap the oldest value for the new one
+            oldest = self.window[self.index]
+            old_mean = self.mean
+            self.mean += (value - oldest) / size
+            self._m2 += (value - oldest) * (value - self.mean + oldest - old_mean)
+        self.window[self.index] = value
+        self.index = (self.index + 1) % size
+
+    @property
+    def variance(self):
+        return max(self._m2, 0.0) / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+# streaming quantile estimate with the P-square algorithm (Jain & Chlamtac, 1985). keeps 5 markers instead of the
+# data, so memory and update time are constant no matter how long training runs
+class P2Quantile:
+    def __init__(self, quantile):
+        self.quantile = quantile
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value):
+        heights = self.heights
+        if len(heights) < 5:  # not enough points for the markers yet, just collect them
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # nudge the middle markers towards where they should be
+        for i in range(1, 4):
+            offset = self.desired[i] - self.positions[i]
+            if (offset >= 1 and self.positions[i + 1] - self.positions[i] > 1) or \
+                    (offset <= -1 and self.positions[i - 1] - self.positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                self.positions[i] += step
+
+    def _parabolic(self, i, step):
+        h, n = self.heights, self.positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i, step):
+        h, n = self.heights, self.positions
+        return h[i] + step * (h[i + step] - h[i]) / (n[i + step] - n[i])
+
+    @property
+    def value(self):
+        if not self.heights:
+            return math.nan
+        if len(self.heights) < 5:  # exact quantile of what has been seen so far
+            return float(np.quantile(self.heights, self.quantile))
+        return self.heights[2]
+
+
+# one tracked quantity: its last value, and its mean, std and a few quantiles over the last window_size values.
+# the quantiles of the whole run are streamed as well, under their own *_all names
+class MetricTracker:
+    quantiles = (0.5, 0.9)
+
+    def __init__(self, window_size):
+        self.stats = RollingStats(window_size)
+        self.estimators = [P2Quantile(q) for q in self.quantiles]
+        self.last = math.nan
+
+    def add(self, value):
+        self.last = value
+        self.stats.add(value)
+        for estimator in self.estimators:
+            estimator.add(value)
+
+    def summary(self, name):
+        out = {name: self.last, name + '_mean': self.stats.mean, name + '_std': self.stats.std}
+        # the window's order doesn't matter for quantiles, and sorting a fixed size window is constant work
+        window = self.stats.window[:self.stats.count]
+        window_quantiles = np.quantile(window, self.quantiles) if len(window) else [math.nan] * len(self.quantiles)
+        for q, windowed, estimator in zip(self.quantiles, window_quantiles, self.estimators):
+            out['%s_p%d' % (name, round(q * 100))] = float(windowed)
+            out['%s_p%d_all' % (name, round(q * 100))] = estimator.value
+        return out
+
+
+# appends one record per line as JSON lines, or as CSV if the file name ends in .csv. with append the records go
+# after those already in the file (e.g. of the run being resumed) instead of replacing them
+class MetricsStream:
+    def __init__(self, path, flush_every=10, append=False):
+        self.path = path
+        self.is_csv = path.endswith('.csv')
+        self.flush_every = flush_every
+        self._columns = None
+        if append and self.is_csv and os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, newline='') as existing:  # the header is already there, keep its columns
+                self._columns = next(csv.reader(existing), None)
+        self._file = open(path, 'a' if append else 'w', newline='' if self.is_csv else None)
+        self._writer = None
+        self._unflushed = 0
+
+    def write(self, record):
+        if self.is_csv:
+            if self._writer is None:  # columns are fixed by the file's header or else the first record
+                header = self._columns is None
+                self._writer = csv.DictWriter(self._file, fieldnames=self._columns or list(record.keys()))
+                if header:
+                    self._writer.writeheader()
+            self._writer.writerow(record)
+        else:
+            self._file.write(json.dumps(record) + '\n')
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        self._unflushed = 0
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+# keras-rl callback that streams per-episode metrics to disk while training runs instead of keeping a history.
+# a resumed run appends to the stream of the run it continues, its rolling windows start out empty though
+class MetricsLogger(Callback):
+    tracked = ('episode_reward', 'nb_episode_steps', 'food_eaten', 'steps_per_sec')
+
+    def __init__(self, path, window_size=100, flush_every=10, append=False):
+        super().__init__()
+        self.stream = MetricsStream(path, flush_every, append)
+        self.trackers = {name: MetricTracker(window_size) for name in self.tracked}
+        self.episode_start = time()
+
+    def on_episode_begin(self, episode, logs={}):
+        self.episode_start = time()
+
+    def on_episode_end(self, episode, logs={}):
+        elapsed = time() - self.episode_start
+        game = self.env.unwrapped.last_state
+        values = {'episode_reward': logs['episode_reward'],
+                  'nb_episode_steps': logs['nb_episode_steps'],
+                  'food_eaten': game.food_eaten if game is not None else 0,
+                  'steps_per_sec': logs['nb_episode_steps'] / elapsed if elapsed > 0 else math.nan}
+        record = {'episode': int(episode), 'nb_steps': int(logs['nb_steps'])}
+        for name in self.tracked:
+            self.trackers[name].add(float(values[name]))
+            record.update(self.trackers[name].summary(name))
+        self.stream.write(record)
+
+    def on_train_end(self, logs={}):
+        self.stream.close()
+
+
+# lazily yields the records of a metrics stream, one line at a time
+def read_metrics(path):
+    with open(path, newline='' if path.endswith('.csv') else None) as metrics_file:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(metrics_file):
+                yield {key: float(value) for key, value in row.items()}
+        else:
+            for line in metrics_file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# moving average of every window_size adjacent points in O(n)
+# precondition: len(data) >= window_size
+def moving_average(data, window_size):
+    assert len(data) >= window_size
+    sums = np.cumsum(np.insert(np.asarray(data, dtype=float), 0, 0))
+    return (sums[window_size:] - sums[:-window_size]) / window_size
+
+
+# keeps every stride-th record of a stream of unknown length, doubling the stride (and dropping every other kept
+# point) whenever more than max_points are held
+def decimate(records, keys, max_points=1000):
+    columns = {key: [] for key in keys}
+    stride = 1
+    for i, record in enumerate(records):
+        if i % stride:
+            continue
+        for key in keys:
+            columns[key].append(record[key])
+        if len(columns[keys[0]]) > max_points:
+            stride *= 2
+            columns = {key: values[::2] for key, values in columns.items()}
+    return columns
+
+
+# plots the smoothed reward and episode steps from a metrics stream without loading the whole file
+def plot_metrics(path, average_window_size=10, max_points=1000):
+    keys = ('episode', 'episode_reward', 'nb_episode_steps')
+    columns = decimate(read_metrics(path), keys, max_points)
+    if len(columns['episode']) < average_window_size:
+        print('Not enough episodes in', path, 'to plot yet')
+        return None
+
+    # Plotting code adapted from https://matplotlib.org/gallery/api/two_scales.html
+    # Plot the per-episode rewards and steps on the same plot
+    fig, ax1 = plt.subplots()
+    plt.title('Reward and episode steps versus episode number [smoothed]')
+    avg_epoch_slice = moving_average(columns['episode'], average_window_size)
+
+    plot_color = 'tab:blue'
+    ax1.set_xlabel('Episode')
+    ax1.set_ylabel('Episode reward', color=plot_color)
+    ax1.plot(avg_epoch_slice, moving_average(columns['episode_reward'], average_window_size), color=plot_color)
+    ax1.tick_params(axis='y', labelcolor=plot_color)
+
+    ax2 = ax1.twinx()
+
+    plot_color = 'tab:red'
+    ax2.set_ylabel('Episode steps', color=plot_color)
+    ax2.plot(avg_epoch_slice, moving_average(columns['nb_episode_steps'], average_window_size),
+             color=plot_color)
+    ax2.tick_params(axis='y', labelcolor=plot_color)
+
+    fig.tight_layout()
+    return fig
+
+
+# can be pointed at the stream of a run that is still training
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', type=str)
+    parser.add_argument('--window', type=int, default=10)
+    args = parser.parse_args()
+    if os.path.exists(args.path) and plot_metrics(args.path, args.window) is not None:
+        plt.show()
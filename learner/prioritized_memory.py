@@ -0,0 +1,248 @@
+from collections import namedtuple
+
+import numpy as np
+from rl.agents.dqn import DQNAgent
+from rl.memory import Memory, Experience
+
+# a sampled minibatch: stacked states (batch, window_length, *obs_shape), the transitions' actions, rewards and
+# whether state1 is terminal, the importance sampling weight of each sample and the slots to update priorities at
+PrioritizedBatch = namedtuple('PrioritizedBatch', 'state0, action, reward, state1, terminal1, weights, indices')
+
+
+# binary sum tree over capacity leaves, stored as a flat array with the root at 1 and the children of node i at 2i
+# and 2i + 1. every node holds the sum (and the min, for the importance sampling weights) of the leaves below it,
+# so a prefix sum search and a leaf update both touch one node per level. batches are handled a level at a time
+class SumTree:
+    def __init__(self, capacity):
+        self.capacity = 1
+        while self.capacity < capacity:
+            self.capacity *= 2
+        self.depth = self.capacity.bit_length() - 1
+        self.sums = np.zeros(2 * self.capacity)
+        self.mins = np.full(2 * self.capacity, np.inf)  # empty (zero) leaves don't count towards the min
+
+    @property
+    def total(self):
+        return self.sums[1]
+
+    @property
+    def min(self):
+        return self.mins[1]
+
+    def __getitem__(self, indices):
+        return self.sums[np.asarray(indices) + self.capacity]
+
+    def update(self, indices, values):
+        nodes = np.asarray(indices) + self.capacity
+        values = np.asarray(values, dtype=float)
+        self.sums[nodes] = values
+        self.mins[nodes] = np.where(values > 0, values, np.inf)
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.sums[nodes] = self.sums[2 * nodes] + self.sums[2 * nodes + 1]
+            self.mins[nodes] = np.minimum(self.mins[2 * nodes], self.mins[2 * nodes + 1])
+
+    # the same as update for a single leaf, without the per level numpy overhead. used on every append
+    def update_one(self, index, value):
+        sums, mins = self.sums, self.mins
+        node = index + self.capacity
+        sums[node] = value
+        mins[node] = value if value > 0 else np.inf
+        node //= 2
+        while node >= 1:
+            left = 2 * node
+            sums[node] = sums[left] + sums[left + 1]
+            mins[node] = min(mins[left], mins[left + 1])
+            node //= 2
+
+    # for every value in [0, total) the leaf whose range of the cumulative sum holds it
+    def find(self, values):
+        values = np.array(values, dtype=float)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sums = self.sums[left]
+            go_right = values > left_sums
+            values -= np.where(go_right, left_sums, 0)
+            nodes = left + go_right
+        return nodes - self.capacity
+
+
+# prioritized experience replay (Schaul et al., 2016) for keras-rl agents. transitions are drawn with probability
+# proportional to priority ** alpha, new ones get the highest priority seen so far, and beta (the strength of the
+# importance sampling correction) is annealed from beta to 1 over beta_steps appends.
+# observations live in one preallocated ring (an object array for non-array observations, e.g. SparseFrames) and
+# windows are gathered for the whole batch at once. the windows follow SequentialMemory's rules: a window never
+# reaches back past an episode start and is zero padded instead, and the terminal observation is never a state0
+class PrioritizedMemory(Memory):
+    def __init__(self, limit, alpha=0.6, beta=0.4, beta_steps=1000000, epsilon=1e-6, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+        self.alpha = alpha
+        self.beta_start = beta
+        self.beta_steps = beta_steps
+        self.epsilon = epsilon
+        self.tree = SumTree(limit)
+        self.max_priority = 1.0
+        self.observations = None  # allocated on the first append, once the observation shape is known
+        self.actions = np.zeros(limit, dtype=np.int32)
+        self.rewards = np.zeros(limit, dtype=np.float32)
+        self.terminals = np.zeros(limit, dtype=bool)
+        self.next_index = 0
+        self.size = 0
+        self.appended = 0
+
+    @property
+    def nb_entries(self):
+        return self.size
+
+    @property
+    def beta(self):
+        return min(1.0, self.beta_start + (1.0 - self.beta_start) * self.appended / self.beta_steps)
+
+    def append(self, observation, action, reward, terminal, training=True):
+        super().append(observation, action, reward, terminal, training=training)
+        if not training:
+            return
+        if self.observations is None:
+            if isinstance(observation, np.ndarray):
+                self.observations = np.zeros((self.limit, *observation.shape), dtype=observation.dtype)
+            else:
+                self.observations = np.empty(self.limit, dtype=object)
+
+        index = self.next_index
+        self.observations[index] = observation
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.terminals[index] = terminal
+        self.tree.update_one(index, 0.0)  # nothing follows it yet, so it's no transition
+
+        # the previous observation now has its next state. the terminal observation doesn't, that's the reset
+        if self.size > 0:
+            previous = (index - 1) % self.limit
+            before = (index - 2) % self.limit
+            valid = self.size < 2 or not self.terminals[before]
+            self.tree.update_one(previous, self.max_priority ** self.alpha if valid else 0.0)
+
+        self.next_index = (index + 1) % self.limit
+        self.size = min(self.size + 1, self.limit)
+        self.appended += 1
+
+    # how many entries back from index the ring still holds
+    def _age(self, indices):
+        oldest = (self.next_index - self.size) % self.limit
+        return (indices - oldest) % self.limit
+
+    def sample_batch(self, batch_size):
+        assert self.size >= self.window_length + 2, 'not enough entries in the memory'
+        total = self.tree.total
+        # one draw from each of batch_size equal slices of the total, which spreads the batch over the priorities
+        values = (np.arange(batch_size) + 1 - np.random.uniform(size=batch_size)) * (total / batch_size)
+        indices = self.tree.find(values)
+        stray = self.tree[indices] <= 0  # float error at a slice edge can land on an empty leaf
+        while np.any(stray):
+            indices[stray] = self.tree.find(np.random.uniform(high=total, size=np.count_nonzero(stray)))
+            stray = self.tree[indices] <= 0
+
+        probabilities = self.tree[indices] / total
+        beta = self.beta
+        weights = (self.size * probabilities) ** -beta
+        weights /= (self.size * self.tree.min / total) ** -beta  # the largest possible weight is 1
+
+        state0, state1 = self._windows(indices)
+        return PrioritizedBatch(state0, self.actions[indices], self.rewards[indices], state1,
+                                self.terminals[indices], weights.astype(np.float32), indices)
+
+    # frames index - window_length + 1 ... index + 1 of every sample, with the ones from an earlier episode (or
+    # no longer in the ring) left zero. state1 is state0 shifted by one frame
+    def _windows(self, indices):
+        window = self.window_length
+        offsets = np.arange(-window + 1, 2)
+        frames = (indices[:, None] + offsets) % self.limit
+        ages = self._age(indices)[:, None] + offsets
+        # the last two frames (index itself and its successor) always belong. an earlier frame k belongs if it's
+        # still in the ring and the entry before it wasn't terminal, and the same holds for every frame after it
+        if self.ignore_episode_boundaries:
+            keep = ages >= 0
+        else:
+            keep = (ages >= 1) & ~self.terminals[(frames - 1) % self.limit]
+            keep[:, :-2] = np.flip(np.cumprod(np.flip(keep[:, :-2], axis=1), axis=1), axis=1)
+        keep[:, -2:] = True
+
+        stacked = self.observations[frames]
+        if stacked.dtype == object:
+            stacked[~keep] = None
+        else:
+            stacked[~keep] = 0
+        return stacked[:, :-1], stacked[:, 1:]
+
+    # priorities from the absolute TD errors of a sampled batch
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(np.max(priorities)))
+        self.tree.update(indices, priorities ** self.alpha)
+
+    # keras-rl's Memory interface, for agents that don't know about priorities (they ignore the weights)
+    def sample(self, batch_size, batch_idxs=None):
+        batch = self.sample_batch(batch_size)
+        return [Experience(state0=list(s0), action=a, reward=r, state1=list(s1), terminal1=t)
+                for s0, a, r, s1, t in zip(batch.state0, batch.action, batch.reward, batch.state1, batch.terminal1)]
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(limit=self.limit, alpha=self.alpha, beta=self.beta_start, beta_steps=self.beta_steps,
+                      epsilon=self.epsilon)
+        return config
+
+
+# DQNAgent training on a PrioritizedMemory: every sample's loss is scaled by its importance sampling weight and
+# the new TD errors become the sampled transitions' priorities. the rest of the agent is unchanged
+class PrioritizedDQNAgent(DQNAgent):
+    def backward(self, reward, terminal):
+        if self.step % self.memory_interval == 0:
+            self.memory.append(self.recent_observation, self.recent_action, reward, terminal,
+                               training=self.training)
+
+        metrics = [np.nan for _ in self.metrics_names]
+        if not self.training:
+            return metrics
+
+        if self.step > self.nb_steps_warmup and self.step % self.train_interval == 0:
+            batch = self.memory.sample_batch(self.batch_size)
+            state0_batch = self._process_batch(batch.state0)
+            state1_batch = self._process_batch(batch.state1)
+            rows = np.arange(self.batch_size)
+
+            if self.enable_double_dqn:
+                # the online network picks the next action, the target network values it
+                actions = np.argmax(self.model.predict_on_batch(state1_batch), axis=1)
+                q_batch = self.target_model.predict_on_batch(state1_batch)[rows, actions]
+            else:
+                q_batch = np.max(self.target_model.predict_on_batch(state1_batch), axis=1)
+
+            returns = batch.reward + self.gamma * q_batch * ~batch.terminal1
+            targets = np.zeros((self.batch_size, self.nb_actions), dtype=np.float32)
+            masks = np.zeros((self.batch_size, self.nb_actions), dtype=np.float32)
+            targets[rows, batch.action] = returns
+            masks[rows, batch.action] = 1.
+            td_errors = returns - self.model.predict_on_batch(state0_batch)[rows, batch.action]
+
+            ins = [state0_batch] if type(self.model.input) is not list else state0_batch
+            metrics = self.trainable_model.train_on_batch(
+                ins + [targets, masks], [returns.astype(np.float32), targets],
+                sample_weight=[batch.weights, np.ones(self.batch_size, dtype=np.float32)])
+            # throw away the individual losses, like DQNAgent does
+            metrics = [metric for idx, metric in enumerate(metrics) if idx not in (1, 2)]
+            metrics += self.policy.metrics
+            if self.processor is not None:
+                metrics += self.processor.metrics
+
+            self.memory.update_priorities(batch.indices, td_errors)
+
+        if self.target_model_update >= 1 and self.step % self.target_model_update == 0:
+            self.update_target_model_hard()
+
+        return metrics
+
+    def _process_batch(self, batch):
+        return self.processor.process_state_batch(batch) if self.processor is not None else batch
@@ -0,0 +1,244 @@
+import os
+import sys
+import threading
+from collections import Counter
+from time import perf_counter, sleep
+
+from rl.callbacks import Callback
+
+from snake_impl import GameController
+
+
+# times named stages of the training loop by wrapping the methods that implement them. time spent in a stage that
+# is itself inside another stage (e.g. the model's predict inside the agent's forward) is only counted as the inner
+# stage's self time, so self times add up to the time spent in any stage. every thread keeps its own totals, the
+# engine's controller ticks on a thread of its own
+class StageProfiler:
+    def __init__(self):
+        self._local = threading.local()
+        self._threads = []  # (thread name, totals) of every thread that entered a stage
+        self._lock = threading.Lock()
+        self._patched = []
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.start_time = perf_counter()
+        self.end_time = None
+
+    def stop(self):
+        self.end_time = perf_counter()
+
+    # replaces obj.name with a timed version, obj may be an instance or a class (to time every instance)
+    def wrap(self, obj, name, stage):
+        original = getattr(obj, name)
+        had_own = name in vars(obj)
+        profiler = self
+
+        def timed(*args, **kwargs):
+            profiler._enter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                profiler._exit(stage)
+
+        setattr(obj, name, timed)
+        self._patched.append((obj, name, original if had_own else None))
+
+    # puts back everything wrap() replaced
+    def unwrap_all(self):
+        for obj, name, original in reversed(self._patched):
+            if original is not None:
+                setattr(obj, name, original)
+            else:
+                delattr(obj, name)
+        self._patched.clear()
+
+    def _totals(self):
+        totals = getattr(self._local, 'totals', None)
+        if totals is None:
+            totals = self._local.totals = {}
+            self._local.stack = []
+            with self._lock:
+                self._threads.append((threading.current_thread().name, totals))
+        return totals
+
+    def _enter(self):
+        self._totals()
+        self._local.stack.append([perf_counter(), 0.0])  # start time, time spent in nested stages
+
+    def _exit(self, stage):
+        end = perf_counter()
+        start, nested = self._local.stack.pop()
+        elapsed = end - start
+        entry = self._local.totals.get(stage)
+        if entry is None:
+            entry = self._local.totals[stage] = [0, 0.0, 0.0]  # calls, total time, self time
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] += elapsed - nested
+        if self._local.stack:
+            self._local.stack[-1][1] += elapsed
+
+    def wall_time(self):
+        end = self.end_time if self.end_time is not None else perf_counter()
+        return end - self.start_time if self.start_time is not None else 0.0
+
+    # one row per (thread, stage) as (thread, stage, calls, total seconds, self seconds), slowest first
+    def rows(self):
+        with self._lock:
+            threads = list(self._threads)
+        rows = [(thread, stage, calls, total, self_time)
+                for thread, totals in threads for stage, (calls, total, self_time) in list(totals.items())]
+        return sorted(rows, key=lambda row: row[4], reverse=True)
+
+    def report(self, steps=None):
+        wall = self.wall_time()
+        lines = []
+        if steps is not None:
+            lines.append('Profiled %d steps in %.1f s (%.1f steps/sec)' % (steps, wall, steps / wall if wall else 0))
+        lines.append('%-24s %-20s %10s %10s %10s %7s %10s' %
+                     ('thread', 'stage', 'calls', 'total s', 'self s', '% wall', 'us/call'))
+        for thread, stage, calls, total, self_time in self.rows():
+            lines.append('%-24s %-20s %10d %10.2f %10.2f %6.1f%% %10.1f' %
+                         (thread[:24], stage, calls, total, self_time, 100 * self_time / wall if wall else 0,
+                          1e6 * total / calls))
+        return '\n'.join(lines)
+
+
+# samples the stack of every other thread each interval seconds and counts identical stacks, which is the
+# collapsed format flamegraph.pl and speedscope read. nothing is timed between samples, so the overhead is one
+# stack walk per thread per sample no matter how hot the code is. the sampler needs the GIL to look, so while it
+# runs the interpreter switches threads more often, otherwise samples pile up wherever C code releases the GIL.
+# the switch interval is process wide: it is put back as soon as sampling ends, however it ends, and report()
+# says which interval the sampled stretch ran with since timings taken in it are skewed by the extra switches
+class StackSampler:
+    def __init__(self, interval=0.005, max_duration=None):
+        self.interval = interval
+        self.max_duration = max_duration
+        self.stacks = Counter()
+        self.samples = 0
+        self.sampled_time = 0.0
+        self.switch_interval = None  # (the interval sampling ran with, the one it replaced), once started
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        original = sys.getswitchinterval()
+        self.switch_interval = (min(original, self.interval / 10), original)
+        sys.setswitchinterval(self.switch_interval[0])
+        self._thread = threading.Thread(target=self._run, args=(original,), name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, original_switch_interval):
+        own_id = threading.get_ident()
+        names = {}
+        started = perf_counter()
+        try:
+            while not self._stop.is_set():
+                if self.max_duration is not None and perf_counter() - started > self.max_duration:
+                    return
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    if thread_id not in names:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    self.stacks[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+                self.samples += 1
+                sleep(self.interval)
+        finally:
+            sys.setswitchinterval(original_switch_interval)
+            self.sampled_time += perf_counter() - started
+
+    def report(self):
+        if self.switch_interval is None:
+            return 'No stacks sampled'
+        sampled, original = self.switch_interval
+        return ('Sampled stacks %d times over %.1f s every %.1f ms; the interpreter switch interval was %.2f ms '
+                'instead of %.2f ms while sampling, so stage timings from that stretch run slower than usual' %
+                (self.samples, self.sampled_time, 1e3 * self.interval, 1e3 * sampled, 1e3 * original))
+
+    @staticmethod
+    def _collapse(thread_name, frame):
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ';'.join(reversed(frames))
+
+    # one "frame;frame;frame count" line per distinct stack
+    def write_collapsed(self, path):
+        with open(path, 'w') as out:
+            for stack, count in self.stacks.most_common():
+                out.write('%s %d\n' % (stack, count))
+
+
+# times the stages of a keras-rl DQN training loop: env stepping and the wait for the engine's next state, the
+# engine's ticks, the processor, replay sampling, the networks' forward and training passes and the rest of the
+# agent's own forward/backward
+def instrument_agent(profiler, agent, env):
+    profiler.wrap(env, 'step', 'env.step')
+    snake_env = env.unwrapped
+    if hasattr(snake_env, 'get_and_forward_state'):
+        profiler.wrap(snake_env, 'get_and_forward_state', 'env.queue_wait')
+    profiler.wrap(GameController, 'tick', 'engine.tick')
+    profiler.wrap(GameController, 'advance', 'engine.advance')
+    if agent.processor is not None:
+        for name in ('process_observation', 'process_state_batch', 'process_reward'):
+            profiler.wrap(agent.processor, name, 'processor.' + name[len('process_'):])
+    profiler.wrap(agent.memory, 'sample', 'memory.sample')
+    if hasattr(agent.memory, 'sample_batch'):
+        profiler.wrap(agent.memory, 'sample_batch', 'memory.sample')
+    profiler.wrap(agent.memory, 'append', 'memory.append')
+    profiler.wrap(agent.model, 'predict_on_batch', 'model.predict')
+    if hasattr(agent, 'target_model'):
+        profiler.wrap(agent.target_model, 'predict_on_batch', 'target_model.predict')
+    if hasattr(agent, 'trainable_model'):
+        profiler.wrap(agent.trainable_model, 'train_on_batch', 'model.train')
+    profiler.wrap(agent, 'forward', 'agent.forward')
+    profiler.wrap(agent, 'backward', 'agent.backward')
+
+
+# keras-rl callback driving a profiling run: stage timers cover the whole run, the stack sampler only the steps
+# in [sample_start, sample_start + sample_steps). the report is printed and the stacks written when training ends
+class ProfilingCallback(Callback):
+    def __init__(self, profiler, sampler=None, sample_start=0, sample_steps=10000, stacks_path=None):
+        super().__init__()
+        self.profiler = profiler
+        self.sampler = sampler
+        self.sample_start = sample_start
+        self.sample_end = sample_start + sample_steps
+        self.stacks_path = stacks_path
+        self.steps = 0
+
+    def on_train_begin(self, logs={}):
+        self.profiler.start()
+        if self.sampler is not None and self.sample_start == 0:
+            self.sampler.start()
+
+    def on_step_end(self, step, logs={}):
+        self.steps += 1
+        if self.sampler is not None:
+            if self.steps == self.sample_start:
+                self.sampler.start()
+            elif self.steps == self.sample_end:
+                self.sampler.stop()
+
+    def on_train_end(self, logs={}):
+        self.profiler.stop()
+        print(self.profiler.report(self.steps))
+        if self.sampler is not None:
+            self.sampler.stop()
+            print(self.sampler.report())
+            if self.stacks_path is not None:
+                self.sampler.write_collapsed(self.stacks_path)
+                print('Wrote', self.sampler.samples, 'stack samples to', self.stacks_path)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the learner is run as scripts from its own directory and imports its modules by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,119 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip('rl')
+pytest.importorskip('keras')
+
+from rl.memory import SequentialMemory
+
+from checkpoint import (AsyncCheckpointWriter, AsyncModelCheckpoint, load_checkpoint, restore_memory,
+                        snapshot_memory, write_checkpoint)
+from prioritized_memory import PrioritizedMemory
+
+
+class FakeModel:
+    def __init__(self, weights):
+        self.weights = weights
+
+    def get_weights(self):
+        return [w.copy() for w in self.weights]
+
+    def set_weights(self, weights):
+        self.weights = [w.copy() for w in weights]
+
+
+class FakeAgent:
+    def __init__(self, memory, seed):
+        self.model = FakeModel([np.random.default_rng(seed).normal(size=(3, 2))])
+        self.memory = memory
+        self.step = 0
+        self.nb_steps_warmup = 10
+
+
+# keras-rl draws a new index for a window that crosses an episode boundary, seeding makes the draws repeat
+def sample(memory):
+    np.random.seed(0)
+    random.seed(0)
+    return memory.sample(8, batch_idxs=list(range(3, 11)))
+
+
+def fill(memory, steps, start=0):
+    for i in range(start, start + steps):
+        memory.append(np.full(2, i, dtype=np.float32), i % 4, float(i), i % 7 == 6)
+
+
+def test_write_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'agent.ckpt')
+    snapshot = {'step': 42, 'weights': [np.arange(6.0).reshape(2, 3)], 'rng': {'python': (3, (1, 2), None)}}
+    write_checkpoint(snapshot, path)
+    loaded = load_checkpoint(path)
+    assert loaded['step'] == 42 and loaded['rng'] == snapshot['rng']
+    np.testing.assert_array_equal(loaded['weights'][0], snapshot['weights'][0])
+    assert os.listdir(str(tmp_path)) == ['agent.ckpt']  # no temporary files left behind
+
+
+def test_writer_keeps_the_last_checkpoints(tmp_path):
+    writer = AsyncCheckpointWriter(keep_last=2)
+    for step in range(1, 6):
+        writer.save({'step': step}, str(tmp_path / ('%d.ckpt' % step)))
+    writer.save({'step': 5}, str(tmp_path / 'final.ckpt'), keep_forever=True)
+    writer.save({'step': 5}, str(tmp_path / '5.ckpt'))  # writing a kept path again doesn't count it twice
+    writer.close()
+    assert sorted(os.listdir(str(tmp_path))) == ['4.ckpt', '5.ckpt', 'final.ckpt']
+    assert load_checkpoint(str(tmp_path / '4.ckpt'))['step'] == 4
+
+
+@pytest.mark.parametrize('memory_class', [SequentialMemory, PrioritizedMemory])
+def test_memory_round_trip(memory_class):
+    memory = memory_class(limit=20, window_length=2)
+    fill(memory, 25)  # wraps around the ring
+    snapshot = snapshot_memory(memory)
+    expected = sample(memory)
+    fill(memory, 5, start=100)  # later appends don't leak into the snapshot
+
+    restored = memory_class(limit=20, window_length=2)
+    restore_memory(restored, snapshot)
+    assert restored.nb_entries == 20
+    for old, new in zip(expected, sample(restored)):
+        for field in ('state0', 'action', 'reward', 'state1', 'terminal1'):
+            np.testing.assert_array_equal(np.asarray(getattr(old, field)), np.asarray(getattr(new, field)))
+
+    with pytest.raises(ValueError):
+        restore_memory(memory_class(limit=30, window_length=2), snapshot)
+
+
+def resume(checkpoint, seed):
+    agent = FakeAgent(SequentialMemory(limit=20, window_length=1), seed)
+    callback = AsyncModelCheckpoint(None, '{step}.ckpt', interval=1000, resume_from=checkpoint)
+    callback.model = agent
+    callback.on_train_begin()
+    agent.step = 0  # what fit() does after on_train_begin
+    callback.on_episode_begin(0)
+    return agent, callback
+
+
+def test_resume_with_and_without_memory(tmp_path):
+    writer = AsyncCheckpointWriter()
+    agent = FakeAgent(SequentialMemory(limit=20, window_length=1), seed=0)
+    fill(agent.memory, 12)
+    callback = AsyncModelCheckpoint(writer, str(tmp_path / '{step}.ckpt'), interval=3, include_memory=True)
+    callback.model = agent
+    callback.on_train_begin()
+    for step in range(6):
+        callback.on_step_end(step)
+        agent.step += 1
+    writer.close()
+    assert sorted(os.listdir(str(tmp_path))) == ['3.ckpt', '6.ckpt']
+    checkpoint = load_checkpoint(str(tmp_path / '6.ckpt'))
+
+    resumed, callback = resume(checkpoint, seed=1)
+    assert resumed.step == callback.total_steps == 6
+    assert resumed.nb_steps_warmup == 10 and resumed.memory.nb_entries == 12
+    np.testing.assert_array_equal(resumed.model.weights[0], agent.model.weights[0])
+
+    del checkpoint['memory']
+    resumed, callback = resume(checkpoint, seed=1)
+    assert resumed.nb_steps_warmup == 16 and resumed.memory.nb_entries == 0
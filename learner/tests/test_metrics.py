@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('rl')
+pytest.importorskip('matplotlib')
+
+from metrics import MetricTracker, MetricsStream, read_metrics
+
+
+def test_quantiles_cover_the_same_window_as_the_mean():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.normal(0, 1, 5000), rng.normal(50, 1, 5000)])
+    tracker = MetricTracker(100)
+    for value in values:
+        tracker.add(value)
+    summary = tracker.summary('reward')
+    window = values[-100:]
+    assert summary['reward_mean'] == pytest.approx(window.mean())
+    assert summary['reward_std'] == pytest.approx(window.std(ddof=1))
+    assert summary['reward_p50'] == pytest.approx(np.quantile(window, 0.5))
+    assert summary['reward_p90'] == pytest.approx(np.quantile(window, 0.9))
+    # the whole run estimate sits between the two halves
+    assert 0 < summary['reward_p50_all'] < 50
+
+
+def test_summary_before_the_window_fills():
+    tracker = MetricTracker(100)
+    assert np.isnan(tracker.summary('x')['x_p50'])
+    for value in (3.0, 1.0, 2.0):
+        tracker.add(value)
+    summary = tracker.summary('x')
+    assert summary['x_p50'] == 2.0 and summary['x_p50_all'] == 2.0
+
+
+@pytest.mark.parametrize('name', ['metrics.jsonl', 'metrics.csv'])
+def test_resumed_stream_appends(tmp_path, name):
+    path = str(tmp_path / name)
+    stream = MetricsStream(path)
+    stream.write({'episode': 0, 'episode_reward': 1.0})
+    stream.close()
+    stream = MetricsStream(path, append=True)
+    stream.write({'episode': 1, 'episode_reward': 2.0})
+    stream.close()
+    assert [record['episode'] for record in read_metrics(path)] == [0, 1]
+
+    stream = MetricsStream(path)  # a new run starts the stream over
+    stream.write({'episode': 0, 'episode_reward': 3.0})
+    stream.close()
+    assert [record['episode_reward'] for record in read_metrics(path)] == [3.0]
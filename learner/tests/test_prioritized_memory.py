@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('rl')
+
+from prioritized_memory import SumTree, PrioritizedMemory
+
+
+def test_find_is_a_prefix_sum_search():
+    rng = np.random.default_rng(0)
+    tree = SumTree(37)  # not a power of two, the padding leaves stay empty
+    priorities = rng.uniform(0, 5, size=37)
+    priorities[[3, 20]] = 0
+    tree.update(np.arange(37), priorities)
+    assert tree.total == pytest.approx(priorities.sum())
+
+    values = rng.uniform(0, tree.total, size=1000)
+    expected = np.searchsorted(np.cumsum(priorities), values, side='left')
+    np.testing.assert_array_equal(tree.find(values), expected)
+    assert not np.isin([3, 20], tree.find(values)).any()  # empty leaves are never found
+
+
+def test_min_ignores_empty_leaves():
+    tree = SumTree(8)
+    assert tree.min == np.inf
+    tree.update([0, 1, 2], [4., 2., 3.])
+    assert tree.min == 2.
+    tree.update_one(1, 0.)
+    assert tree.min == 3.
+    tree.update([0, 2], [0., 0.])
+    assert tree.min == np.inf and tree.total == 0
+
+
+def test_update_one_matches_update():
+    rng = np.random.default_rng(1)
+    batched, single = SumTree(50), SumTree(50)
+    for index, value in zip(rng.integers(0, 50, size=40), rng.uniform(0, 3, size=40)):
+        batched.update([index], [value])
+        single.update_one(int(index), float(value))
+    np.testing.assert_allclose(batched.sums, single.sums)
+    np.testing.assert_array_equal(batched.mins, single.mins)
+
+
+# observations are the step number, so windows can be checked by value
+def filled_memory(limit, steps, episode_length, window_length=3):
+    memory = PrioritizedMemory(limit, window_length=window_length)
+    for step in range(steps):
+        memory.append(np.full(2, step, dtype=np.int32), step % 4, float(step), step % episode_length == 0)
+    return memory
+
+
+def test_ring_overwrites_the_oldest_entries():
+    memory = filled_memory(limit=16, steps=40, episode_length=1000)
+    assert memory.nb_entries == 16 and memory.next_index == 40 % 16
+    assert sorted(memory.observations[:, 0]) == list(range(24, 40))
+    # the newest entry has no next state yet, so it can't be sampled
+    assert memory.tree[[(memory.next_index - 1) % 16]][0] == 0
+
+    batch = memory.sample_batch(64)
+    first = batch.state0[:, 0, 0]
+    newest = batch.state0[:, -1, 0]
+    # a window never reaches back past the oldest entry still held, it's zero padded instead
+    assert np.all((first == 0) | (first >= 24))
+    np.testing.assert_array_equal(batch.state1[:, -1, 0], newest + 1)
+    np.testing.assert_array_equal(batch.action, newest % 4)
+
+
+def test_windows_stop_at_episode_starts():
+    # like keras-rl, a terminal flag on step k means the transition from k ended the episode. step k + 1 is the
+    # terminal observation, which never starts a transition and doesn't belong to the next episode's windows
+    memory = filled_memory(limit=100, steps=60, episode_length=5)
+    batch = memory.sample_batch(256)
+    for state0, state1, terminal in zip(batch.state0[:, :, 0], batch.state1[:, :, 0], batch.terminal1):
+        newest = state0[-1]
+        assert newest == 0 or (newest - 1) % 5 != 0
+        window = [newest]
+        for step in (newest - 1, newest - 2):
+            if step <= 0 or (step - 1) % 5 == 0:  # the oldest entry can't be checked and isn't used either
+                break
+            window.insert(0, step)
+        np.testing.assert_array_equal(state0, [0] * (3 - len(window)) + window)
+        assert state1[-1] == newest + 1 and terminal == (newest % 5 == 0)
+
+
+def test_priorities_and_weights():
+    memory = filled_memory(limit=64, steps=64, episode_length=1000)
+    batch = memory.sample_batch(32)
+    assert np.all(batch.weights <= 1) and np.all(memory.tree[batch.indices] > 0)
+
+    memory.update_priorities(batch.indices[:1], [10.])
+    assert memory.max_priority == pytest.approx(10 + memory.epsilon)
+    counts = np.bincount(np.concatenate([memory.sample_batch(32).indices for _ in range(200)]), minlength=64)
+    assert counts.argmax() == batch.indices[0]
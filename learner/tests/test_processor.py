@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('rl')
+pytest.importorskip('keras')
+
+from rl.memory import SequentialMemory
+
+import gym_snake.envs.observations as observations
+from Driver import SnakeProcessor, SparseFrame
+
+WIDTH, HEIGHT = 4, 3
+
+
+# a one segment snake on cell i and the food on the cell after it
+def sparse_frame(i):
+    x, y = i % WIDTH, i // WIDTH
+    return {'segments': np.array([[x, y]], dtype=np.int16), 'order': np.zeros(1, dtype=np.int32),
+            'food': np.array([(x + 1) % WIDTH, y], dtype=np.int16)}
+
+
+def test_sampled_windows_keep_every_sparse_frame():
+    processor = SnakeProcessor(sparse_board=(WIDTH, HEIGHT))
+    memory = SequentialMemory(limit=100, window_length=3)
+    frames = [sparse_frame(i) for i in range(8)]
+    for frame in frames:
+        memory.append(processor.process_observation(frame), 0, 0., False, training=True)
+
+    # sample index i is the transition from frame i to frame i + 1
+    experiences = memory.sample(2, batch_idxs=[4, 6])
+    # batched the way DQNAgent.process_state_batch does it
+    state0 = processor.process_state_batch(np.array([e.state0 for e in experiences]))
+    state1 = processor.process_state_batch(np.array([e.state1 for e in experiences]))
+    # keras-rl 0.4 builds state1 from np.copy'd frames, keras-rl2 from deepcopies
+    state1_copied = processor.process_state_batch(np.array([[np.copy(frame) for frame in e.state1]
+                                                            for e in experiences]))
+
+    for row, idx in enumerate([4, 6]):
+        expected0 = observations.densify_batch(frames[idx - 2:idx + 1], WIDTH, HEIGHT)
+        expected1 = observations.densify_batch(frames[idx - 1:idx + 2], WIDTH, HEIGHT)
+        np.testing.assert_array_equal(state0[row], expected0)
+        np.testing.assert_array_equal(state1[row], expected1)
+        np.testing.assert_array_equal(state1_copied[row], expected1)
+
+
+def test_windows_are_padded_before_an_episode_start():
+    processor = SnakeProcessor(sparse_board=(WIDTH, HEIGHT))
+    memory = SequentialMemory(limit=100, window_length=3)
+    frames = [sparse_frame(i) for i in range(6)]
+    for i, frame in enumerate(frames):
+        memory.append(processor.process_observation(frame), 0, 0., i == 2, training=True)
+
+    # the episode ended after frame 2, so the window ending on frame 4 doesn't reach back into it
+    experience = memory.sample(1, batch_idxs=[4])[0]
+    padding = sum(not isinstance(frame, SparseFrame) for frame in experience.state0)
+    assert padding > 0
+    state0 = processor.process_state_batch(np.array([experience.state0]))
+    expected = observations.densify_batch([observations.EMPTY_SPARSE] * padding + frames[5 - 3 + padding:5],
+                                          WIDTH, HEIGHT)
+    np.testing.assert_array_equal(state0[0], expected)
+
+
+def test_unwrap_copied_frames():
+    frame = SparseFrame(sparse_frame(0))
+    assert SparseFrame.unwrap(np.copy(frame)) is frame.obs
+    assert SparseFrame.unwrap(frame) is frame.obs
+    assert SparseFrame.unwrap(np.copy(0.)) is observations.EMPTY_SPARSE
@@ -0,0 +1,42 @@
+import sys
+import threading
+from time import sleep
+
+import pytest
+
+pytest.importorskip('rl')
+
+from profiling import StackSampler
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampler_restores_switch_interval():
+    original = sys.getswitchinterval()
+    stop = threading.Event()
+    worker = threading.Thread(target=busy, args=(stop,))
+    worker.start()
+    try:
+        sampler = StackSampler(interval=0.001)
+        sampler.start()
+        assert sys.getswitchinterval() < original
+        sleep(0.05)
+        sampler.stop()
+        assert sys.getswitchinterval() == original
+        assert sampler.samples > 0 and any('busy' in stack for stack in sampler.stacks)
+        assert sampler.switch_interval == (0.0001, original)
+        assert '%.2f ms' % (1e3 * original) in sampler.report()
+
+        # sampling that runs out on its own puts the interval back without waiting for stop()
+        sampler = StackSampler(interval=0.001, max_duration=0.01)
+        sampler.start()
+        sampler._thread.join(1)
+        assert sys.getswitchinterval() == original
+        sampler.stop()
+    finally:
+        stop.set()
+        worker.join()
+        sys.setswitchinterval(original)
@@ -1,2 +1,5 @@
 from snake_impl.game_controller import GameController
 from snake_impl.snake import Snake
+from snake_impl.headless import HeadlessSnake
+from snake_impl.engine_pool import EnginePool
+from snake_impl.replay import EpisodeLog, EpisodeReplayer
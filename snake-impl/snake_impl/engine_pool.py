@@ -0,0 +1,98 @@
+import threading
+
+from snake_impl.config import Config as Cfg
+from snake_impl.headless import HeadlessSnake
+from snake_impl.snake import Snake
+
+
+# keeps engines that are no longer used so new envs can take them over instead of starting new ones. a threaded
+# Snake costs a thread, an event loop and its queues (and maybe a gui), so a sweep that creates and closes envs over
+# and over only ever holds as many engines as it had envs open at once. engines are only handed out again with the
+# same board, truncation and view settings, and are restarted on release so the next user gets a fresh game.
+# at most max_idle engines of each kind are kept (None for no limit), the rest are stopped on release
+class EnginePool:
+    RESTART_TIMEOUT = 10
+
+    def __init__(self, max_idle=None):
+        self.max_idle = max_idle
+        self._idle = {}  # settings key -> idle engines, most recently released last
+        self._lock = threading.Lock()
+        self._closed = False
+        self.created = 0
+        self.reused = 0
+        self.stopped = 0
+
+    # an idle engine with these settings, or a new (started) one. intermediate and out_view are Snake's, they don't
+    # matter for headless engines
+    def acquire(self, headless=False, width=Cfg.gameplay.board.width, height=Cfg.gameplay.board.height,
+                max_ticks=Cfg.gameplay.truncation.max_ticks,
+                starvation_factor=Cfg.gameplay.truncation.starvation_area_factor, intermediate=False, out_view=True):
+        key = self._key(headless, width, height, max_ticks, starvation_factor, intermediate, out_view)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Engine pool is closed')
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+
+        if headless:
+            return HeadlessSnake(width, height, max_ticks, starvation_factor)
+        engine = Snake(intermediate, out_view, width, height, max_ticks, starvation_factor)
+        engine.start()
+        return engine
+
+    # takes an engine back once its user is done with it. a threaded engine that stopped, e.g. because its gui window
+    # was closed, or that doesn't restart in time can't be reused and is stopped instead
+    def release(self, engine):
+        if isinstance(engine, Snake):
+            if not engine.restart(timeout=self.RESTART_TIMEOUT):
+                self._stop(engine)
+                return
+        else:
+            engine.reset()
+        key = self._engine_key(engine)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if not self._closed and (self.max_idle is None or len(idle) < self.max_idle):
+                idle.append(engine)
+                return
+        self._stop(engine)
+
+    # stops every idle engine. engines still in use are stopped when they're released
+    def close(self):
+        with self._lock:
+            self._closed = True
+            engines = [engine for idle in self._idle.values() for engine in idle]
+            self._idle.clear()
+        for engine in engines:
+            self._stop(engine)
+
+    def idle_count(self):
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+    def stats(self):
+        return {'created': self.created, 'reused': self.reused, 'stopped': self.stopped, 'idle': self.idle_count()}
+
+    def _stop(self, engine):
+        if isinstance(engine, Snake):
+            engine.stop()
+        with self._lock:
+            self.stopped += 1
+
+    @staticmethod
+    def _key(headless, width, height, max_ticks, starvation_factor, intermediate, out_view):
+        if headless:
+            return 'headless', width, height, max_ticks, starvation_factor
+        return 'threaded', width, height, max_ticks, starvation_factor, intermediate, out_view
+
+    @classmethod
+    def _engine_key(cls, engine):
+        if isinstance(engine, Snake):
+            return cls._key(False, engine.game_width, engine.game_height, engine.max_ticks, engine.starvation_factor,
+                            engine.intermediate, engine.has_out_view)
+        controller = engine.controller
+        return cls._key(True, engine.game_width, engine.game_height, controller.max_ticks,
+                        controller.starvation_factor, False, False)
@@ -0,0 +1 @@
+from snake_impl.expert.expert_policy import ExpertPolicy
@@ -0,0 +1,290 @@
+from collections import deque
+
+from snake_impl.config import Config as Cfg
+from snake_impl.model.game import Game
+
+
+# scripted player for generating demonstrations. on boards with a Hamiltonian cycle the snake's body is kept in
+# cycle order (tail to head along the cycle), and the head only ever moves forward along the cycle into the empty
+# stretch before the tail: it can't run into itself and gets closer to the food every tick. while the snake is
+# shorter than cycle_fraction of the board it takes shortcuts across the cycle, as long as they don't skip the food
+# and leave room to grow. a body that isn't in cycle order (or a board without a cycle) is played greedily instead:
+# the shortest path to the food as long as the snake can still reach its own tail afterwards, else walking the
+# cycle or chasing the tail, and back onto the cycle as soon as following it is safe. after stall_factor board
+# areas of ticks without eating the snake is forced to make progress even if that's riskier.
+# cells are flat indices x + y * width, actions are indices into Game.ACTIONS
+class ExpertPolicy:
+    def __init__(self, width, height, growth_rate=Cfg.gameplay.growth_rate, cycle_fraction=0.5, stall_factor=2):
+        self.width = width
+        self.height = height
+        self.growth_rate = growth_rate
+        self.cycle_length = int(cycle_fraction * width * height)
+        self.stall_limit = stall_factor * width * height
+
+        # neighbors of every cell as (cell, action) pairs, computed once per board
+        cells = width * height
+        self.neighbors = [[] for _ in range(cells)]
+        for x in range(width):
+            for y in range(height):
+                for action, direction in enumerate(Game.ACTIONS):
+                    nx, ny = x + int(direction[0]), y + int(direction[1])
+                    if 0 <= nx < width and 0 <= ny < height:
+                        self.neighbors[x + y * width].append((nx + ny * width, action))
+        cycle = self._hamiltonian_cycle()
+        self.cycle_action = self.cycle_index = None
+        if cycle is not None:
+            self.cycle_action = [None] * cells
+            self.cycle_index = [0] * cells
+            for i, (current, following) in enumerate(zip(cycle, cycle[1:] + cycle[:1])):
+                self.cycle_action[current] = self._action_between(current, following)
+                self.cycle_index[current] = i
+
+        # search buffers reused by every bfs, a cell counts as visited when it holds the current stamp
+        self._visited = [0] * cells
+        self._parent = [-1] * cells
+        self._stamp = 0
+
+        # the path currently being followed as (head before the move, action) pairs, valid while the food stays put
+        self._plan = deque()
+        self._plan_food = None
+
+        # ticks since the food last moved (was eaten), to notice the snake going round in circles
+        self._last_food = None
+        self._stalled_ticks = 0
+
+    def reset(self):
+        self._plan.clear()
+        self._plan_food = None
+        self._last_food = None
+        self._stalled_ticks = 0
+
+    def cell(self, pos):
+        return int(pos[0]) + int(pos[1]) * self.width
+
+    def act(self, game):
+        head = self.cell(game.segments[0])
+        food = self.cell(game.food_pos) if game.food_pos is not None else None
+        if food != self._last_food:
+            self._last_food = food
+            self._stalled_ticks = 0
+        self._stalled_ticks += 1
+
+        # the game is deterministic until new food appears, so a checked plan stays safe to follow
+        if self._plan and food == self._plan_food and self._plan[0][0] == head:
+            return self._plan.popleft()[1]
+        self._plan.clear()
+
+        body = [self.cell(seg) for seg in game.segments]
+        growth = game.growth_queued
+
+        if self.cycle_action is not None:
+            if self._in_cycle_order(body):
+                action = self._ordered_move(body, growth, food)
+                if action is not None:
+                    return action
+            # following the cycle for a body length straightens the snake out along it, from then on it's in order
+            if self._rejoin_safe(body, growth, food):
+                return self.cycle_action[head]
+
+        stalled = self._stalled_ticks > self.stall_limit
+        if self.cycle_action is not None and (stalled or len(body) >= self.cycle_length):
+            action = self._cycle_move(body, growth, check_tail=not stalled)
+            if action is not None:
+                return action
+
+        if food is not None:
+            path = self._bfs(head, self._free_times(body, growth), lambda cell: cell == food)
+            # new food can spawn right next to the snake, so leave room for growing once more. a stalled snake
+            # takes the food regardless, ending the episode is better than circling until it's cut off
+            if path is not None and (stalled or self._tail_reachable(
+                    *self._simulate(body, growth + self.growth_rate, path, food)) is not None):
+                self._plan_food = food
+                for before, after in zip([head] + path, path):
+                    self._plan.append((before, self._action_between(before, after)))
+                return self._plan.popleft()[1]
+
+        if self.cycle_action is not None:
+            action = self._cycle_move(body, growth)
+            if action is not None:
+                return action
+
+        return self._survival_move(body, growth, food)
+
+    # how far cell is ahead of start along the cycle
+    def _cycle_distance(self, start, cell):
+        return (self.cycle_index[cell] - self.cycle_index[start]) % len(self.cycle_index)
+
+    # whether walking the cycle from the tail passes every segment in order up to the head
+    def _in_cycle_order(self, body):
+        tail = body[-1]
+        previous = len(self.cycle_index)
+        for cell in body[:-1]:
+            distance = self._cycle_distance(tail, cell)
+            if distance == 0 or distance >= previous:
+                return False
+            previous = distance
+        return True
+
+    # the move that gets furthest along the cycle towards the food while keeping the body in cycle order, or None
+    # if even the cycle's own next cell is taken (only when the snake grows into its tail)
+    def _ordered_move(self, body, growth, food):
+        head = body[0]
+        to_tail = self._cycle_distance(head, body[-1]) or len(self.cycle_index)
+        to_food = self._cycle_distance(head, food) if food is not None else to_tail
+        shortcuts = len(body) + growth < self.cycle_length
+        best_action, best_distance = None, 0
+        for neighbor, action in self.neighbors[head]:
+            distance = self._cycle_distance(head, neighbor)
+            if distance == 0 or distance >= to_tail or distance <= best_distance:
+                continue
+            if distance > 1:  # a shortcut
+                if not shortcuts or (to_food < to_tail and distance > to_food):
+                    continue
+                grown = max(growth - 1, 0) + (self.growth_rate if neighbor == food else 0)
+                # the cells left between the head and the tail have to fit the growth and two more foods' worth, plus
+                # a body length for the cells skipped by shortcuts to drain before food spawned ahead closes the gap
+                if to_tail - distance - 1 - grown < 2 * self.growth_rate + len(body):
+                    continue
+            best_action, best_distance = action, distance
+        return best_action
+
+    # whether the snake can follow the cycle until none of its current body is left, without running into itself
+    def _rejoin_safe(self, body, growth, food):
+        remaining = deque(body)
+        occupied = set(body)
+        cell = body[0]
+        moved = 0  # how many times the tail moved on, the body is all cycle once it left every old segment
+        while moved < len(body) - 1:
+            cell = self._neighbor(cell, self.cycle_action[cell])
+            if cell in occupied:  # the controller checks before the tail moves
+                return False
+            if growth > 0:
+                growth -= 1
+            else:
+                occupied.discard(remaining.pop())
+                moved += 1
+            remaining.appendleft(cell)
+            occupied.add(cell)
+            if cell == food:
+                growth += self.growth_rate
+        return True
+
+    # the number of ticks until each body cell can be entered. the controller checks for collisions before the tail
+    # moves, so segment i of n is in the way for n - i + growth ticks
+    @staticmethod
+    def _free_times(body, growth):
+        n = len(body)
+        return {cell: n - i + growth + 1 for i, cell in enumerate(body)}
+
+    # shortest path from start to the first cell accepted by is_goal, treating body cells as walls until they move
+    # out of the way. returns the cells after start, or None if no goal can be reached
+    def _bfs(self, start, free_times, is_goal):
+        self._stamp += 1
+        stamp = self._stamp
+        visited, parent = self._visited, self._parent
+        visited[start] = stamp
+        frontier = [start]
+        depth = 0
+        while frontier:
+            depth += 1
+            next_frontier = []
+            for cell in frontier:
+                for neighbor, _ in self.neighbors[cell]:
+                    if visited[neighbor] == stamp or free_times.get(neighbor, 0) > depth:
+                        continue
+                    visited[neighbor] = stamp
+                    parent[neighbor] = cell
+                    if is_goal(neighbor):
+                        return self._trace(start, neighbor)
+                    next_frontier.append(neighbor)
+            frontier = next_frontier
+        return None
+
+    def _trace(self, start, end):
+        path = [end]
+        while self._parent[path[-1]] != start:
+            path.append(self._parent[path[-1]])
+        path.reverse()
+        return path
+
+    # the body and growth left after walking path, eating the food if the path ends on it
+    def _simulate(self, body, growth, path, food=None):
+        body = deque(body)
+        for cell in path:
+            if growth > 0:
+                growth -= 1
+            else:
+                body.pop()
+            body.appendleft(cell)
+        if food is not None and path[-1] == food:
+            growth += self.growth_rate
+        return list(body), growth
+
+    # length of the path from the head back onto the body once that part of it has moved on, which means the snake
+    # can keep following itself. None if the snake boxed itself in
+    def _tail_reachable(self, body, growth):
+        if len(body) == 1:
+            return 0
+        free_times = self._free_times(body, growth)
+        path = self._bfs(body[0], free_times, lambda cell: cell in free_times)
+        return len(path) if path is not None else None
+
+    # the cycle's next move, if taking it doesn't kill the snake (or, with check_tail, trap it)
+    def _cycle_move(self, body, growth, check_tail=True):
+        action = self.cycle_action[body[0]]
+        target = self._neighbor(body[0], action)
+        if self._free_times(body, growth).get(target, 0) > 1:
+            return None
+        if check_tail and self._tail_reachable(*self._simulate(body, growth, [target])) is None:
+            return None
+        return action
+
+    # no safe way to the food: take the move that keeps the longest way back to the tail open, or failing that any
+    # move that doesn't die right away
+    def _survival_move(self, body, growth, food):
+        free_times = self._free_times(body, growth)
+        best_action, best_length = None, -1
+        fallback = None
+        for neighbor, action in self.neighbors[body[0]]:
+            if free_times.get(neighbor, 0) > 1:
+                continue
+            fallback = action
+            length = self._tail_reachable(*self._simulate(body, growth, [neighbor], food))
+            if length is not None and length > best_length:
+                best_action, best_length = action, length
+        if best_action is not None:
+            return best_action
+        if fallback is not None:
+            return fallback
+        return 0  # every move dies
+
+    def _neighbor(self, cell, action):
+        direction = Game.ACTIONS[action]
+        return cell + int(direction[0]) + int(direction[1]) * self.width
+
+    def _action_between(self, cell, neighbor):
+        for candidate, action in self.neighbors[cell]:
+            if candidate == neighbor:
+                return action
+
+    # the cells of a Hamiltonian cycle in order, or None when the board has none (both sides odd). rows are swept
+    # back and forth from column 1 and column 0 is the way back to the start
+    def _hamiltonian_cycle(self):
+        width, height = self.width, self.height
+        if width < 2 or height < 2 or (width % 2 == 1 and height % 2 == 1):
+            return None
+
+        if height % 2 == 0:
+            order = [(0, y) for y in range(height - 1, -1, -1)]
+            for y in range(height):
+                xs = range(1, width) if y % 2 == 0 else range(width - 1, 0, -1)
+                order.extend((x, y) for x in xs)
+            order = order[height:] + order[:height]
+        else:  # sweep columns instead, with row 0 as the way back
+            order = [(x, 0) for x in range(width - 1, -1, -1)]
+            for x in range(width):
+                ys = range(1, height) if x % 2 == 0 else range(height - 1, 0, -1)
+                order.extend((x, y) for y in ys)
+            order = order[width:] + order[:width]
+
+        return [x + y * width for x, y in order]
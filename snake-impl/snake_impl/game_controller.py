@@ -1,6 +1,6 @@
 import numpy as np
 
-import random
+import math
 import asyncio
 from time import time
 
@@ -11,27 +11,44 @@ import snake_impl.messages.message as Msg
 
 
 # controller for the game object
+# both queues may be None to drive the game directly (see HeadlessSnake), states are then just not published
+# a game is truncated after max_ticks ticks, or after starvation_factor * board area ticks without eating
 class GameController:
 
-    def __init__(self, view_queue, controller_queue, game):
+    def __init__(self, view_queue, controller_queue, game, max_ticks=Cfg.gameplay.truncation.max_ticks,
+                 starvation_factor=Cfg.gameplay.truncation.starvation_area_factor):
         self.view_queue = view_queue
         self.controller_queue = controller_queue
         self.game = game
+        self.max_ticks = max_ticks
+        self.starvation_factor = starvation_factor
+        self.starvation_limit = math.ceil(starvation_factor * game.width * game.height) \
+            if starvation_factor is not None else None
+        self.task = None  # the periodic tick, once started on an event loop
         self.generate_food()  # must be before the tick is sent out so we don't send out stale data
-        self.view_queue.put(Msg.StateUpdated(game))
+        self.publish()
 
-    def restart(self):
+    # seed is the new game's seed, a random one if None
+    def restart(self, seed=None):
         if Cfg.debug.console_debug_info:
             print('Restart request acknowledged')
-        # clear the event queues
-        while not self.view_queue.empty():
-            self.view_queue.get()
-        while not self.controller_queue.empty():
-            self.controller_queue.get()
-
-        self.game = Game(self.game.width, self.game.height)
+        # clear the event queues, marking what was dropped as done so anyone joining the queues isn't left waiting
+        if self.view_queue is not None:
+            while not self.view_queue.empty():
+                self.view_queue.get()
+                self.view_queue.task_done()
+        if self.controller_queue is not None:
+            while not self.controller_queue.empty():
+                self.controller_queue.get()
+                self.controller_queue.task_done()
+
+        self.game = Game(self.game.width, self.game.height, seed)
         self.generate_food()
-        self.view_queue.put(Msg.StateUpdated(self.game))
+        self.publish()
+
+    def publish(self):
+        if self.view_queue is not None:
+            self.view_queue.put(Msg.StateUpdated(self.game))
 
     # advances the game by one tick, perform all necessary game actions
     def tick(self):
@@ -61,30 +78,39 @@ class GameController:
 
         self.change_dir(dir_request)
 
+        if self.advance():
+            self.publish()
+
+    # moves the snake one cell in its next direction, returns whether the game was in progress and kept going
+    def advance(self):
         if not self.game.started() or self.game.ended():
-            return
+            return False
 
         self.game.last_update_time = time()
 
         snake = self.game.segments
         self.game.dir = self.game.next_dir
+        self.game.action_log.append(Game.action_index(self.game.dir))  # recorded before it can kill the snake
         head = snake[0]
         new_head = head + self.game.dir
 
         # only advance game state if we didn't just die
         if self.game.is_in_bounds(new_head):
-            if self.np_arr_in_list(snake, new_head):  # snake will collide with itself
+            if self.game.snake_contains(new_head):  # snake will collide with itself
                 self.game_over()
-                return
+                return False
 
             if self.game.growth_queued > 0:  # check whether to lengthen snake or just move it
                 self.game.growth_queued -= 1
             else:
-                snake.pop()
+                self.game.pop_tail()
 
-            snake.insert(0, new_head)  # move head of snake
+            self.game.push_head(new_head)  # move head of snake
+            self.game.ticks += 1
+            self.game.ticks_since_food += 1
 
             if np.array_equal(self.game.food_pos, new_head):
+                self.game.ticks_since_food = 0
                 self.game.food_eaten += 1
                 self.game.score += Cfg.gameplay.scoring.food_eaten
                 board_size = self.game.width * self.game.height
@@ -98,9 +124,23 @@ class GameController:
 
         else:
             self.game_over()
-            return
+            return False
+
+        if not self.game.ended():
+            self.check_truncation()
+        return True
 
-        self.view_queue.put(Msg.StateUpdated(self.game))
+    def check_truncation(self):
+        if self.max_ticks is not None and self.game.ticks >= self.max_ticks:
+            self.truncate('max_ticks')
+        elif self.starvation_limit is not None and self.game.ticks_since_food >= self.starvation_limit:
+            self.truncate('starvation')
+
+    def truncate(self, reason):
+        if Cfg.debug.console_debug_info:
+            print('Game truncated (%s) after %d ticks' % (reason, self.game.ticks))
+        self.game.state = GameState.TRUNCATED
+        self.game.truncation_reason = reason
 
     def game_over(self):
         if Cfg.debug.console_debug_info:
@@ -114,16 +154,15 @@ class GameController:
                    self.game.food_eaten,
                    time() - self.game.game_start_time))
         self.game.state = GameState.LOST
-        self.view_queue.put(Msg.StateUpdated(self.game))
+        self.publish()
 
     def generate_food(self):
-        legal_spaces = []
-        for i in range(self.game.width):
-            for j in range(self.game.height):
-                cell = np.array([i, j])
-                if not self.np_arr_in_list(self.game.segments, cell):
-                    legal_spaces.append(cell)
-        new_food = random.choice(legal_spaces)
+        # free cells in the same (column-major) order as looping over i then j, so the choice is unchanged
+        occupied = np.zeros(shape=(self.game.width, self.game.height), dtype=bool)
+        segs = np.asarray(self.game.segments)
+        occupied[segs[:, 0], segs[:, 1]] = True
+        legal_spaces = np.argwhere(~occupied)
+        new_food = np.array(self.game.rng.choice(legal_spaces))
         self.game.food_pos = new_food
         return new_food
 
@@ -162,9 +201,15 @@ class GameController:
         # start_time = time.time()
         print('Initializing game controller')
 
-        event_loop.create_task(self.periodic(event_loop, Cfg.gameplay.game_tick_sec))
+        self.task = event_loop.create_task(self.periodic(event_loop, Cfg.gameplay.game_tick_sec))
         # await self._periodic.start()
 
+    # stops ticking. must be called on the event loop's thread, the game is left as it is
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
     def start_game(self):
         self.game.state = GameState.IN_PROGRESS
         self.game.game_start_time = time()
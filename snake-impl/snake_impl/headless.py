@@ -0,0 +1,31 @@
+from snake_impl.config import Config as Cfg
+from snake_impl.game_controller import GameController
+from snake_impl.model import Game
+
+
+# runs the game synchronously on the calling thread: no queues, no event loop and no tick pacing. every step
+# advances the game by exactly one tick, as fast as the controller can go
+class HeadlessSnake:
+    def __init__(self, width=Cfg.gameplay.board.width, height=Cfg.gameplay.board.height,
+                 max_ticks=Cfg.gameplay.truncation.max_ticks,
+                 starvation_factor=Cfg.gameplay.truncation.starvation_area_factor):
+        self.game_width = width
+        self.game_height = height
+        self.controller = GameController(None, None, Game(width, height), max_ticks, starvation_factor)
+
+    @property
+    def game(self):
+        return self.controller.game
+
+    # seed picks the new game's food and initial direction, see Game
+    def reset(self, seed=None):
+        self.controller.restart(seed)
+        return self.game
+
+    # direction is one of the Game direction arrays, the first step starts the game like the first key press would
+    def step(self, direction):
+        if not self.game.started():
+            self.controller.start_game()
+        self.controller.change_dir(direction)
+        self.controller.advance()
+        return self.game
@@ -1,25 +1,44 @@
 from enum import Enum
 import numpy as np
 from snake_impl.config import Config as Cfg
+from snake_impl.model.zobrist import ZobristKeys, HEAD
 import random
 
 
 # Class for the game model
+# state_hash is a Zobrist hash of the board (snake, food, direction and queued growth), kept up to date in O(1) by
+# push_head, pop_tail and the food_pos, dir and growth_queued setters. score and timing are not part of it
+# everything random about a game (its initial direction and food) comes from rng, seeded with seed. together with
+# action_log, the direction taken on every tick, that is enough to replay it exactly (see snake_impl.replay)
 class Game:
     LEFT = np.array([-1, 0])
     RIGHT = np.array([1, 0])
     UP = np.array([0, -1])
     DOWN = np.array([0, 1])
     DIR_MAP = {'LEFT': LEFT, 'RIGHT': RIGHT, 'UP': UP, 'DOWN': DOWN}
+    ACTIONS = [LEFT, RIGHT, UP, DOWN]  # discrete action order, matches the gym env's action space
+    ACTION_OFFSETS = [(int(d[0]), int(d[1])) for d in ACTIONS]
+    ACTION_INDEX = {offset: i for i, offset in enumerate(ACTION_OFFSETS)}
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, seed=None):
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.rng = random.Random(self.seed)
+        self.action_log = bytearray()
         self.score = 0
         self.width = width
         self.height = height
         self.growth_rate = Cfg.gameplay.growth_rate
-        self.segments = [np.array([width // 2, height // 2])]
+        self.zobrist = ZobristKeys.for_board(width, height)
+        self.state_hash = 0
+        self._dir = None
+        self._food_pos = None
+        self._growth_queued = 0
+        self.segments = []
+        self.occupied = set()  # the segments as (x, y) tuples, for O(1) lookups
+        self.push_head(np.array([width // 2, height // 2]))
         initial_dir = Cfg.gameplay.initial_direction
-        self.dir = self.DIR_MAP[initial_dir] if initial_dir != 'RANDOM' else random.choice(list(self.DIR_MAP.values()))
+        self.dir = self.DIR_MAP[initial_dir] if initial_dir != 'RANDOM' \
+            else self.rng.choice(list(self.DIR_MAP.values()))
         self.next_dir = self.dir
         self.state = State.NOT_STARTED
         self.growth_queued = Cfg.gameplay.initial_size - 1
@@ -27,22 +46,99 @@ class Game:
         self.food_pos = None
         self.game_start_time = -1
         self.last_update_time = -1
+        self.ticks = 0
+        self.ticks_since_food = 0
+        self.truncation_reason = None  # why the game was cut short, if it was
 
     def is_in_bounds(self, cell):
         [x, y] = cell
         return 0 <= x < self.width and 0 <= y < self.height
 
+    @property
+    def dir(self):
+        return self._dir
+
+    @dir.setter
+    def dir(self, new_dir):
+        if self._dir is not None:
+            self.state_hash ^= self.zobrist.dir_key(self._dir)
+        self.state_hash ^= self.zobrist.dir_key(new_dir)
+        self._dir = new_dir
+
+    @property
+    def food_pos(self):
+        return self._food_pos
+
+    @food_pos.setter
+    def food_pos(self, pos):
+        self.state_hash ^= self.zobrist.food_key(self._food_pos) ^ self.zobrist.food_key(pos)
+        self._food_pos = pos
+
+    @property
+    def growth_queued(self):
+        return self._growth_queued
+
+    @growth_queued.setter
+    def growth_queued(self, growth):
+        self.state_hash ^= self.zobrist.growth_key(self._growth_queued) ^ self.zobrist.growth_key(growth)
+        self._growth_queued = growth
+
+    # the hash rebuilt from scratch, always equal to state_hash
+    def compute_hash(self):
+        keys = self.zobrist
+        h = keys.dir_key(self.dir) ^ keys.food_key(self.food_pos) ^ keys.growth_key(self.growth_queued)
+        if self.segments:
+            h ^= keys.segment_key(self.segments[0], HEAD)
+        for ahead, pos in zip(self.segments, self.segments[1:]):
+            h ^= keys.link_key(pos, ahead)
+        return h
+
+    @classmethod
+    def action_index(cls, direction):
+        return cls.ACTION_INDEX[(int(direction[0]), int(direction[1]))]
+
     def snake_contains(self, cell):
-        for snake_cell in self.segments:
-            if np.array_equal(snake_cell, cell):
-                return True
-        return False
+        return (int(cell[0]), int(cell[1])) in self.occupied
+
+    # segments should only be changed through these two so the occupied cells and the hash stay in sync
+    def push_head(self, cell):
+        if self.segments:
+            old_head = self.segments[0]
+            self.state_hash ^= self.zobrist.segment_key(old_head, HEAD) ^ self.zobrist.link_key(old_head, cell)
+        self.state_hash ^= self.zobrist.segment_key(cell, HEAD)
+        self.segments.insert(0, cell)
+        self.occupied.add((int(cell[0]), int(cell[1])))
+
+    def pop_tail(self):
+        tail = self.segments.pop()
+        self.occupied.discard((int(tail[0]), int(tail[1])))
+        if self.segments:
+            self.state_hash ^= self.zobrist.link_key(tail, self.segments[-1])
+        else:
+            self.state_hash ^= self.zobrist.segment_key(tail, HEAD)
+        return tail
+
+    # which of ACTIONS are worth taking next: not a reversal (which the controller ignores) and not straight into a
+    # wall or the body. the tail counts as body, collisions are checked before it moves. with safe=False only
+    # reversals are masked out
+    def action_mask(self, safe=True):
+        mask = np.ones(len(self.ACTIONS), dtype=bool)
+        head_x, head_y = int(self.segments[0][0]), int(self.segments[0][1])
+        dir_x, dir_y = int(self.dir[0]), int(self.dir[1])
+        can_reverse = len(self.segments) == 1
+        for i, (dx, dy) in enumerate(self.ACTION_OFFSETS):
+            if not can_reverse and dx == -dir_x and dy == -dir_y:
+                mask[i] = False
+            elif safe:
+                x, y = head_x + dx, head_y + dy
+                mask[i] = 0 <= x < self.width and 0 <= y < self.height and (x, y) not in self.occupied
+        return mask
 
     def started(self):
         return self.state != State.NOT_STARTED
 
     def ended(self):
-        return self.state == State.LOST or self.state == State.WON
+        return self.state == State.LOST or self.state == State.WON or self.state == State.TRUNCATED
 
     def won(self):
         return self.state == State.WON
@@ -50,9 +146,13 @@ class Game:
     def lost(self):
         return self.state == State.LOST
 
+    def truncated(self):
+        return self.state == State.TRUNCATED
+
 
 class State(Enum):
     NOT_STARTED = 0
     IN_PROGRESS = 1
     LOST = 2
     WON = 3
+    TRUNCATED = 4  # cut short by a tick limit, the snake didn't die
@@ -0,0 +1,59 @@
+import random
+
+HEAD = 4  # link of the head segment, the others link towards the segment in front of them (an index into OFFSETS)
+OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # same order as Game.ACTIONS
+_OFFSET_INDEX = {offset: i for i, offset in enumerate(OFFSETS)}
+_SEED = 0x5EED5A4E
+
+
+# random 64 bit keys for Zobrist hashing a board. a state's hash is the XOR of the keys of everything in it: every
+# segment as (cell, link to the segment in front of it), the food cell, the direction and the queued growth. the
+# links pin down the order of the segments, so two states only share a hash if the whole snake matches.
+# keys are drawn from a fixed seed, so hashes agree between processes and runs. use for_board to share them
+class ZobristKeys:
+    _boards = {}
+
+    def __init__(self, width, height, seed=_SEED):
+        rng = random.Random(seed ^ (width << 16) ^ height)
+        cells = width * height
+        self.width = width
+        self.segment = [[rng.getrandbits(64) for _ in range(HEAD + 1)] for _ in range(cells)]
+        self.food = [rng.getrandbits(64) for _ in range(cells)]
+        self.dir = [rng.getrandbits(64) for _ in OFFSETS]
+        # growth can keep stacking up, so its keys come from their own stream and are drawn as they are needed
+        self._growth_rng = random.Random(rng.getrandbits(64))
+        self._growth = []
+
+    @classmethod
+    def for_board(cls, width, height):
+        keys = cls._boards.get((width, height))
+        if keys is None:
+            keys = cls._boards[(width, height)] = cls(width, height)
+        return keys
+
+    def cell(self, pos):
+        return int(pos[0]) + int(pos[1]) * self.width
+
+    def segment_key(self, pos, link):
+        return self.segment[self.cell(pos)][link]
+
+    # key of pos for a segment whose next segment towards the head is ahead
+    def link_key(self, pos, ahead):
+        return self.segment_key(pos, link(pos, ahead))
+
+    def food_key(self, pos):
+        return self.food[self.cell(pos)] if pos is not None else 0
+
+    def dir_key(self, direction):
+        return self.dir[_OFFSET_INDEX[(int(direction[0]), int(direction[1]))]]
+
+    def growth_key(self, growth):
+        if growth <= 0:
+            return 0
+        while len(self._growth) < growth:
+            self._growth.append(self._growth_rng.getrandbits(64))
+        return self._growth[growth - 1]
+
+
+def link(pos, ahead):
+    return _OFFSET_INDEX[(int(ahead[0]) - int(pos[0]), int(ahead[1]) - int(pos[1]))]
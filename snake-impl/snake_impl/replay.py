@@ -0,0 +1,204 @@
+import argparse
+import gzip
+import math
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from snake_impl.config import Config as Cfg
+from snake_impl.game_controller import GameController
+from snake_impl.model.game import Game
+from snake_impl.model.game import State as GameState
+
+_MAGIC = b'SNKL'
+_VERSION = 2
+# magic, version, width, height, seed, max ticks (-1 for none), starvation factor (nan for none), score,
+# food eaten, ticks, final state, number of actions, then the rules: growth rate, initial size, initial direction
+# (index into _DIRECTIONS), points per food, points for winning
+_HEADER = struct.Struct('<4sBHHQidiIIBIHHBii')
+_DIRECTIONS = ['RANDOM'] + list(Game.DIR_MAP)
+
+# the gameplay config a game depends on besides its board and truncation limits. a log can only be replayed
+# under the rules it was recorded with
+GameRules = namedtuple('GameRules', 'growth_rate, initial_size, initial_direction, food_score, winning_extra')
+
+
+# the rules new games are played by right now
+def current_rules():
+    gameplay = Cfg.gameplay
+    return GameRules(gameplay.growth_rate, gameplay.initial_size, gameplay.initial_direction,
+                     gameplay.scoring.food_eaten, gameplay.scoring.winning_extra)
+
+
+# everything needed to replay one game: the board, the engine's truncation limits, the rules, the seed of the
+# game's rng and the direction taken on every tick, plus the final result to check a replay against. actions are
+# stored at two bits each, so a log is a few dozen bytes plus a quarter byte per step. rules default to the
+# current ones
+class EpisodeLog:
+    def __init__(self, width, height, seed, actions, max_ticks=None, starvation_factor=None, score=0, food_eaten=0,
+                 ticks=0, state=GameState.NOT_STARTED, rules=None):
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.actions = bytes(actions)  # indices into Game.ACTIONS, one per tick
+        self.max_ticks = max_ticks
+        self.starvation_factor = starvation_factor
+        self.score = score
+        self.food_eaten = food_eaten
+        self.ticks = ticks
+        self.state = state
+        self.rules = rules if rules is not None else current_rules()
+
+    # the log of the game controller is playing (or just finished)
+    @classmethod
+    def from_controller(cls, controller):
+        return cls.from_game(controller.game, controller.max_ticks, controller.starvation_factor)
+
+    @classmethod
+    def from_game(cls, game, max_ticks=None, starvation_factor=None):
+        rules = current_rules()._replace(growth_rate=game.growth_rate)
+        return cls(game.width, game.height, game.seed, game.action_log, max_ticks, starvation_factor, game.score,
+                   game.food_eaten, game.ticks, game.state, rules)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def to_bytes(self):
+        rules = self.rules
+        header = _HEADER.pack(_MAGIC, _VERSION, self.width, self.height, self.seed,
+                              self.max_ticks if self.max_ticks is not None else -1,
+                              self.starvation_factor if self.starvation_factor is not None else math.nan,
+                              self.score, self.food_eaten, self.ticks, self.state.value, len(self.actions),
+                              rules.growth_rate, rules.initial_size, _DIRECTIONS.index(rules.initial_direction),
+                              rules.food_score, rules.winning_extra)
+        return header + _pack_actions(self.actions)
+
+    @classmethod
+    def from_bytes(cls, data):
+        (magic, version, width, height, seed, max_ticks, starvation_factor, score, food_eaten, ticks, state,
+         num_actions, growth_rate, initial_size, direction, food_score, winning_extra) = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('Not a version %d episode log' % _VERSION)
+        rules = GameRules(growth_rate, initial_size, _DIRECTIONS[direction], food_score, winning_extra)
+        actions = _unpack_actions(data[_HEADER.size:], num_actions)
+        return cls(width, height, seed, actions, max_ticks if max_ticks >= 0 else None,
+                   starvation_factor if not math.isnan(starvation_factor) else None, score, food_eaten, ticks,
+                   GameState(state), rules)
+
+
+# four actions to a byte, the first one in the lowest bits
+def _pack_actions(actions):
+    codes = np.frombuffer(bytes(actions), dtype=np.uint8)
+    codes = np.concatenate([codes, np.zeros(-len(codes) % 4, dtype=np.uint8)]).reshape(-1, 4)
+    return (codes[:, 0] | codes[:, 1] << 2 | codes[:, 2] << 4 | codes[:, 3] << 6).astype(np.uint8).tobytes()
+
+
+def _unpack_actions(packed, num_actions):
+    packed = np.frombuffer(packed, dtype=np.uint8, count=(num_actions + 3) // 4)
+    codes = np.stack([packed & 3, packed >> 2 & 3, packed >> 4 & 3, packed >> 6 & 3], axis=1)
+    return codes.reshape(-1)[:num_actions].tobytes()
+
+
+def _open_archive(path, mode):
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+# appends logs to an archive of length prefixed records, gzipped if the file name ends in .gz
+def write_archive(path, logs, append=True):
+    with _open_archive(path, 'ab' if append else 'wb') as archive:
+        for log in logs:
+            data = log.to_bytes()
+            archive.write(struct.pack('<I', len(data)))
+            archive.write(data)
+
+
+# lazily yields the logs of an archive, one record at a time
+def read_archive(path):
+    with _open_archive(path, 'rb') as archive:
+        while True:
+            size = archive.read(4)
+            if not size:
+                return
+            yield EpisodeLog.from_bytes(archive.read(struct.unpack('<I', size)[0]))
+
+
+# rebuilds the states of a logged game by running the controller directly, as fast as it can tick: no queues,
+# threads or pacing. the game is only valid until the next step/seek, observations are computed from it on demand.
+# replaying fixed logs and checking verify() is also a cheap regression test for changes to the controller.
+# a log recorded under different rules than the current config would go out of sync, so that raises a ValueError
+class EpisodeReplayer:
+    def __init__(self, log):
+        self.log = log
+        self.controller = None
+        if log.rules != current_rules():
+            differences = ', '.join('%s %s (config has %s)' % (name, recorded, current) for name, recorded, current
+                                    in zip(GameRules._fields, log.rules, current_rules()) if recorded != current)
+            raise ValueError('Episode was recorded under different rules: ' + differences)
+        self.reset()
+
+    @property
+    def game(self):
+        return self.controller.game
+
+    # the number of ticks replayed so far
+    @property
+    def position(self):
+        return len(self.game.action_log)
+
+    def reset(self):
+        game = Game(self.log.width, self.log.height, self.log.seed)
+        self.controller = GameController(None, None, game, self.log.max_ticks, self.log.starvation_factor)
+        return self.game
+
+    # replays the next tick, returns False once the log is used up
+    def step(self):
+        position = self.position
+        if position >= len(self.log.actions) or self.game.ended():
+            return False
+        if not self.game.started():
+            self.controller.start_game()
+        self.controller.change_dir(Game.ACTIONS[self.log.actions[position]])
+        self.controller.advance()
+        return True
+
+    # the state after k ticks. going backwards replays from the start, there are no snapshots to go back to
+    def seek(self, k):
+        if k < self.position:
+            self.reset()
+        while self.position < k and self.step():
+            pass
+        return self.game
+
+    # yields the state after every tick, starting with the initial one
+    def states(self):
+        self.reset()
+        yield self.game
+        while self.step():
+            yield self.game
+
+    # observation_fn(game) for the state after step (the current state if None), e.g. one of the gym env's
+    # observation functions
+    def observation(self, observation_fn, step=None):
+        if step is not None:
+            self.seek(step)
+        return observation_fn(self.game)
+
+    # replays the whole log and checks the outcome against the recorded one
+    def verify(self):
+        game = self.seek(len(self.log.actions))
+        return self.position == len(self.log.actions) and game.score == self.log.score and \
+            game.food_eaten == self.log.food_eaten and game.ticks == self.log.ticks and game.state == self.log.state
+
+
+# replays every log of an archive, returns the number of logs that didn't reproduce
+def verify_archive(path):
+    return sum(not EpisodeReplayer(log).verify() for log in read_archive(path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks that every episode of an archive replays exactly')
+    parser.add_argument('path', type=str)
+    args = parser.parse_args()
+    print(verify_archive(args.path), 'episodes did not reproduce (growth rate %d, initial size %d)' %
+          (Cfg.gameplay.growth_rate, Cfg.gameplay.initial_size))
@@ -0,0 +1,3 @@
+from snake_impl.server.protocol import GameSnapshot, ProtocolError, parse_address
+from snake_impl.server.server import SnakeServer
+from snake_impl.server.client import SnakeClient, RemoteSnake
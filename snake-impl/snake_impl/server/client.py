@@ -0,0 +1,117 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+from snake_impl.model.game import Game
+import snake_impl.server.protocol as protocol
+
+
+# talks to a SnakeServer over a pool of up to pool_size connections, so several threads can each have a request in
+# flight. every call takes a list of game ids and handles all of them in one round trip
+class SnakeClient:
+    def __init__(self, address, pool_size=4, timeout=None):
+        self.address = address
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._closed = False
+
+    @contextmanager
+    def _connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                sock = self._idle.get_nowait()
+            except queue.Empty:
+                sock = protocol.connect(self.address, self.timeout)
+            try:
+                yield sock
+            except BaseException:  # the stream may be mid-message, don't hand it out again
+                sock.close()
+                raise
+            if self._closed:
+                sock.close()
+            else:
+                self._idle.put(sock)
+        finally:
+            self._slots.release()
+
+    def call(self, request):
+        with self._connection() as sock:
+            protocol.send_message(sock, request)
+            response = protocol.recv_message(sock)
+        if response is None:
+            raise protocol.ProtocolError('Snake server closed the connection')
+        return protocol.unpack_response(response)
+
+    def create(self, count, width, height, max_ticks=None, starvation_factor=None):
+        return protocol.unpack_ids(self.call(protocol.pack_create_request(count, width, height, max_ticks,
+                                                                          starvation_factor)))
+
+    # seeds is one seed (or None) per id, all random if not given
+    def reset(self, ids, width, height, seeds=None):
+        seeds = seeds if seeds is not None else [None] * len(ids)
+        payload = self.call(protocol.pack_request(protocol.RESET, ids, protocol.pack_seeds(seeds)))
+        return protocol.unpack_states(payload, width, height)
+
+    # actions are indices into Game.ACTIONS, one per id
+    def step(self, ids, actions, width, height):
+        payload = self.call(protocol.pack_request(protocol.STEP, ids, protocol.pack_actions(actions)))
+        return protocol.unpack_states(payload, width, height)
+
+    def state(self, ids, width, height):
+        return protocol.unpack_states(self.call(protocol.pack_request(protocol.STATE, ids)), width, height)
+
+    # the EpisodeLog of each game's current (or just finished) episode
+    def logs(self, ids):
+        return protocol.unpack_logs(self.call(protocol.pack_request(protocol.LOG, ids)))
+
+    def close_games(self, ids):
+        self.call(protocol.pack_request(protocol.CLOSE, ids))
+
+    # closes the idle connections, ones still in use are closed when they come back
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# one game on a server, with the same interface as HeadlessSnake so SnakeEnv can drive it. the states it hands
+# out are GameSnapshots
+class RemoteSnake:
+    def __init__(self, client, width, height, max_ticks=None, starvation_factor=None, game_id=None):
+        self.client = client
+        self.game_width = width
+        self.game_height = height
+        self.game_id = game_id if game_id is not None else client.create(1, width, height, max_ticks,
+                                                                         starvation_factor)[0]
+        self._game = None
+
+    @property
+    def game(self):
+        if self._game is None:
+            self._game = self.client.state([self.game_id], self.game_width, self.game_height)[0]
+        return self._game
+
+    def reset(self, seed=None):
+        self._game = self.client.reset([self.game_id], self.game_width, self.game_height, [seed])[0]
+        return self._game
+
+    def step(self, direction):
+        self._game = self.client.step([self.game_id], [Game.action_index(direction)], self.game_width,
+                                      self.game_height)[0]
+        return self._game
+
+    # seed and actions of the current (or just finished) game, as recorded on the server
+    def episode_log(self):
+        return self.client.logs([self.game_id])[0]
+
+    # a state that came back from a batched call made for this game elsewhere (see RemoteSnakeVecEnv)
+    def update(self, game):
+        self._game = game
+
+    def close(self):
+        self.client.close_games([self.game_id])
@@ -0,0 +1,218 @@
+import math
+import socket
+import struct
+
+import numpy as np
+
+from snake_impl.model.game import Game
+from snake_impl.model.game import State as GameState
+from snake_impl.replay import EpisodeLog
+
+# every message is a little endian uint32 length followed by that many bytes. requests start with an opcode and a
+# count, responses with a status. all ids in a request are handled in one round trip
+CREATE = 1  # count new games: width, height, max ticks, starvation factor -> their ids
+RESET = 2  # ids and a seed each (RANDOM_SEED for a random one) -> the new games' states
+STEP = 3  # ids and an action (index into Game.ACTIONS) each -> the states after one tick
+STATE = 4  # ids -> their current states, nothing changes
+CLOSE = 5  # ids -> nothing, the games are dropped
+LOG = 6  # ids -> the EpisodeLog (see snake_impl.replay) of each game so far, length prefixed
+OK = 0
+ERROR = 1
+
+RANDOM_SEED = 2 ** 64 - 1
+TRUNCATION_REASONS = [None, 'max_ticks', 'starvation']
+
+_LENGTH = struct.Struct('<I')
+_REQUEST = struct.Struct('<BI')  # opcode, number of games
+_CREATE = struct.Struct('<HHid')  # width, height, max ticks (-1 for none), starvation factor (nan for none)
+# score, state, food x, food y (-1 for none), dir x, dir y, ticks, food eaten, growth queued, state hash,
+# truncation reason, number of segments. the segments follow as uint16 x, y pairs, head first
+_STATE = struct.Struct('<iBhhbbIIIQBH')
+
+
+class ProtocolError(RuntimeError):
+    pass
+
+
+def send_message(sock, data):
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+# the next message, or None if the other side closed the connection between messages
+def recv_message(sock):
+    header = _recv_exactly(sock, _LENGTH.size)
+    if header is None:
+        return None
+    (length,) = _LENGTH.unpack(header)
+    data = _recv_exactly(sock, length)
+    if data is None:
+        raise ProtocolError('Connection closed mid-message')
+    return data
+
+
+def _recv_exactly(sock, size):
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            if chunks:
+                raise ProtocolError('Connection closed mid-message')
+            return None
+        chunks += chunk
+    return bytes(chunks)
+
+
+def pack_request(opcode, ids=(), payload=b''):
+    return _REQUEST.pack(opcode, len(ids)) + pack_ids(ids) + payload
+
+
+def pack_create_request(count, width, height, max_ticks=None, starvation_factor=None):
+    return _REQUEST.pack(CREATE, count) + pack_create(width, height, max_ticks, starvation_factor)
+
+
+def unpack_request(data):
+    opcode, count = _REQUEST.unpack_from(data)
+    offset = _REQUEST.size
+    if opcode == CREATE:  # the count is the number of games to make, there are no ids yet
+        return opcode, count, data[offset:]
+    ids = np.frombuffer(data, dtype='<u4', count=count, offset=offset)
+    return opcode, ids, data[offset + ids.nbytes:]
+
+
+def pack_ids(ids):
+    return np.asarray(ids, dtype='<u4').tobytes()
+
+
+def unpack_ids(payload):
+    return [int(i) for i in np.frombuffer(payload, dtype='<u4')]
+
+
+def pack_create(width, height, max_ticks=None, starvation_factor=None):
+    return _CREATE.pack(width, height, max_ticks if max_ticks is not None else -1,
+                        starvation_factor if starvation_factor is not None else math.nan)
+
+
+def unpack_create(payload):
+    width, height, max_ticks, starvation_factor = _CREATE.unpack_from(payload)
+    return width, height, max_ticks if max_ticks >= 0 else None, \
+        starvation_factor if not math.isnan(starvation_factor) else None
+
+
+def pack_seeds(seeds):
+    return np.asarray([seed if seed is not None else RANDOM_SEED for seed in seeds], dtype='<u8').tobytes()
+
+
+def unpack_seeds(payload, count):
+    return [int(seed) if seed != RANDOM_SEED else None
+            for seed in np.frombuffer(payload, dtype='<u8', count=count)]
+
+
+def pack_actions(actions):
+    return np.asarray(actions, dtype=np.uint8).tobytes()
+
+
+def unpack_actions(payload, count):
+    return np.frombuffer(payload, dtype=np.uint8, count=count)
+
+
+def pack_ok(payload=b''):
+    return bytes([OK]) + payload
+
+
+def pack_error(message):
+    return bytes([ERROR]) + message.encode('utf-8', 'replace')
+
+
+# the payload of a response, raising the server's error if it failed
+def unpack_response(data):
+    if data[0] == ERROR:
+        raise ProtocolError('Snake server error: ' + data[1:].decode('utf-8', 'replace'))
+    return data[1:]
+
+
+def pack_states(games):
+    return b''.join(_pack_state(game) for game in games)
+
+
+def _pack_state(game):
+    food = game.food_pos if game.food_pos is not None else (-1, -1)
+    segments = np.asarray(game.segments, dtype='<u2')
+    return _STATE.pack(game.score, game.state.value, int(food[0]), int(food[1]), int(game.dir[0]), int(game.dir[1]),
+                       game.ticks, game.food_eaten, game.growth_queued, game.state_hash,
+                       TRUNCATION_REASONS.index(game.truncation_reason), len(segments)) + segments.tobytes()
+
+
+def unpack_states(payload, width, height):
+    states = []
+    offset = 0
+    while offset < len(payload):
+        fields = _STATE.unpack_from(payload, offset)
+        offset += _STATE.size
+        segments = np.frombuffer(payload, dtype='<u2', count=2 * fields[-1], offset=offset).reshape(-1, 2)
+        offset += segments.nbytes
+        states.append(GameSnapshot(width, height, fields, segments.astype(int)))
+    return states
+
+
+def pack_logs(logs):
+    return b''.join(_LENGTH.pack(len(data)) + data for data in (log.to_bytes() for log in logs))
+
+
+def unpack_logs(payload):
+    logs = []
+    offset = 0
+    while offset < len(payload):
+        (length,) = _LENGTH.unpack_from(payload, offset)
+        offset += _LENGTH.size
+        logs.append(EpisodeLog.from_bytes(payload[offset:offset + length]))
+        offset += length
+    return logs
+
+
+# a game as received from a server. it has the fields and methods of Game that observations and the gym env read,
+# but it's a copy: changing it does nothing to the game on the server
+class GameSnapshot:
+    ACTIONS = Game.ACTIONS
+    ACTION_OFFSETS = Game.ACTION_OFFSETS
+
+    def __init__(self, width, height, fields, segments):
+        (self.score, state, food_x, food_y, dir_x, dir_y, self.ticks, self.food_eaten, self.growth_queued,
+         self.state_hash, truncation_reason, _) = fields
+        self.width = width
+        self.height = height
+        self.state = GameState(state)
+        self.food_pos = np.array([food_x, food_y]) if food_x >= 0 else None
+        self.dir = np.array([dir_x, dir_y])
+        self.next_dir = self.dir
+        self.truncation_reason = TRUNCATION_REASONS[truncation_reason]
+        self.segments = list(segments)
+        self.occupied = set(map(tuple, segments.tolist()))
+
+    is_in_bounds = Game.is_in_bounds
+    snake_contains = Game.snake_contains
+    action_mask = Game.action_mask
+    started = Game.started
+    ended = Game.ended
+    won = Game.won
+    lost = Game.lost
+    truncated = Game.truncated
+
+
+# address is a (host, port) pair for TCP or a path for a Unix domain socket
+def connect(address, timeout=None):
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # requests are small, don't wait to batch them
+    sock.settimeout(timeout)
+    sock.connect(address)
+    return sock
+
+
+# 'host:port' or 'unix:/path/to/socket' as given on a command line
+def parse_address(text):
+    if text.startswith('unix:'):
+        return text[len('unix:'):]
+    host, _, port = text.rpartition(':')
+    return host or 'localhost', int(port)
@@ -0,0 +1,127 @@
+import argparse
+import os
+import socketserver
+import threading
+
+from snake_impl.headless import HeadlessSnake
+from snake_impl.model.game import Game
+from snake_impl.replay import EpisodeLog
+import snake_impl.server.protocol as protocol
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    # a connection carries any number of requests, one at a time
+    def handle(self):
+        while True:
+            request = protocol.recv_message(self.request)
+            if request is None:
+                return
+            try:
+                response = protocol.pack_ok(self.server.games.dispatch(request))
+            except Exception as e:  # reported to the client, the connection stays usable
+                response = protocol.pack_error('%s: %s' % (type(e).__name__, e))
+            protocol.send_message(self.request, response)
+
+
+# every game the server hosts, as headless engines keyed by id. games aren't tied to a connection, so any
+# connection of a client's pool can step any of its games
+class GameRegistry:
+    def __init__(self):
+        self.engines = {}
+        self._next_id = 0
+        # the engines are pure python, there is nothing to gain from stepping them in parallel
+        self._lock = threading.Lock()
+
+    def dispatch(self, request):
+        opcode, ids, payload = protocol.unpack_request(request)
+        with self._lock:
+            if opcode == protocol.CREATE:
+                return self.create(ids, *protocol.unpack_create(payload))
+            elif opcode == protocol.RESET:
+                seeds = protocol.unpack_seeds(payload, len(ids))
+                return protocol.pack_states([self.engine(i).reset(seed) for i, seed in zip(ids, seeds)])
+            elif opcode == protocol.STEP:
+                actions = protocol.unpack_actions(payload, len(ids))
+                return protocol.pack_states([self.engine(i).step(Game.ACTIONS[a]) for i, a in zip(ids, actions)])
+            elif opcode == protocol.STATE:
+                return protocol.pack_states([self.engine(i).game for i in ids])
+            elif opcode == protocol.LOG:
+                return protocol.pack_logs([EpisodeLog.from_controller(self.engine(i).controller) for i in ids])
+            elif opcode == protocol.CLOSE:
+                for i in ids:
+                    self.engines.pop(int(i), None)
+                return b''
+        raise ValueError('Unknown opcode %d' % opcode)
+
+    def create(self, count, width, height, max_ticks, starvation_factor):
+        ids = list(range(self._next_id, self._next_id + count))
+        self._next_id += count
+        for i in ids:
+            self.engines[i] = HeadlessSnake(width, height, max_ticks, starvation_factor)
+        return protocol.pack_ids(ids)
+
+    def engine(self, game_id):
+        engine = self.engines.get(int(game_id))
+        if engine is None:
+            raise KeyError('No game with id %d' % game_id)
+        return engine
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+# hosts snake games for other processes (or machines) over TCP or a Unix domain socket, a thread per connection.
+# address is (host, port) or a socket path, see protocol.connect. use serve_forever() or start() for a
+# background thread, and shutdown() to stop
+class SnakeServer:
+    def __init__(self, address):
+        self.games = GameRegistry()
+        if isinstance(address, str):
+            if os.path.exists(address):  # left behind by a server that didn't shut down cleanly
+                os.remove(address)
+            self.server = _UnixServer(address, _RequestHandler)
+        else:
+            self.server = _TCPServer(address, _RequestHandler)
+        self.server.games = self.games
+        self._thread = None
+
+    # the address clients should connect to, with the actual port if port 0 was asked for
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='snake-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hosts snake games for remote envs')
+    parser.add_argument('--address', type=str, default='localhost:5555',
+                        help="'host:port' to listen on TCP, or 'unix:/path' for a Unix domain socket")
+    args = parser.parse_args()
+    snake_server = SnakeServer(protocol.parse_address(args.address))
+    print('Serving snake games on', snake_server.address)
+    try:
+        snake_server.serve_forever()
+    except KeyboardInterrupt:
+        snake_server.server.server_close()
@@ -1,53 +1,129 @@
 import asyncio
 import queue
+import threading
+from time import perf_counter
 
 from snake_impl.model import Game
 from snake_impl import GameController
 from snake_impl.config import Config as Cfg
+from snake_impl.util import LatestMailbox
 from snake_impl.view.gui import GuiThread
 
-from threading import Thread
-
 
+# runs a game on its own event loop thread, talking to it (and the gui, if shown) through queues. the thread is a
+# daemon so a forgotten engine never keeps the process alive, but stop() should be called to release it
 class Snake:
+    RESTART_POLL_INTERVAL = 0.1
+
     def __init__(self, intermediate=False, out_view=True,
-                 width=Cfg.gameplay.board.width, height=Cfg.gameplay.board.height):
-        self.v_out_queue = queue.Queue() if out_view else None  # visual display queue, for final human reading
-        # intermediate view queue, does preprocessing on view and forwards to v_out
+                 width=Cfg.gameplay.board.width, height=Cfg.gameplay.board.height,
+                 max_ticks=Cfg.gameplay.truncation.max_ticks,
+                 starvation_factor=Cfg.gameplay.truncation.starvation_area_factor):
+        # visual display mailbox, for final human reading. it only holds the newest state so a view that draws
+        # slower than the game ticks skips frames instead of holding the game back
+        self.v_out_queue = LatestMailbox() if out_view else None
+        # intermediate view queue, does preprocessing on view and forwards to v_out. every state is kept here
         self.v_int_queue = queue.Queue() if intermediate else self.v_out_queue
         self.c_queue = queue.Queue()  # controller queue, used to send messages to controller
         self.has_out_view = out_view
+        self.intermediate = intermediate
         self.game_width = width
         self.game_height = height
+        self.max_ticks = max_ticks
+        self.starvation_factor = starvation_factor
         self.secondary_event_loop = asyncio.new_event_loop()
+        self.thread = None
+        self.controller = None
+        self.gui = None
 
     async def initialize_system(self, loop):
         game = Game(self.game_width, self.game_height)
-        controller = GameController(self.v_int_queue, self.c_queue, game)
-        controller.start_controller(loop)
+        self.controller = GameController(self.v_int_queue, self.c_queue, game, self.max_ticks,
+                                         self.starvation_factor)
+        self.controller.start_controller(loop)
 
         if self.has_out_view:
-            GuiThread(self.v_out_queue, self.c_queue, loop, self.game_width, self.game_height)
+            self.gui = GuiThread(self.v_out_queue, self.c_queue, loop, self.game_width, self.game_height)
 
     def start(self):
-        # new_loop = asyncio.new_event_loop()
-        t = Thread(target=self._start, args=(self.secondary_event_loop,))
-        t.start()
+        self.thread = threading.Thread(target=self._start, args=(self.secondary_event_loop,), name='snake-engine',
+                                       daemon=True)
+        self.thread.start()
 
     def _start(self, loop):
         asyncio.set_event_loop(loop)
         asyncio.ensure_future(self.initialize_system(loop))
-        loop.run_forever()
+        try:
+            loop.run_forever()
+        finally:
+            # stopped by stop() or by closing the gui window. nothing may be left pending when the loop is closed
+            if self.controller is not None:
+                self.controller.stop()
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+            if self.gui is not None:
+                self.gui.stop()
+
+    # stops the game and closes the gui, waiting up to timeout seconds for the engine thread to finish. the event
+    # loop is closed afterwards, a stopped engine can't be started again
+    def stop(self, timeout=None):
+        loop = self.secondary_event_loop
+        if self.thread is None:
+            loop.close()
+            return
+        try:
+            loop.call_soon_threadsafe(loop.stop)
+        except RuntimeError:  # the loop already stopped and closed, e.g. the gui window was closed
+            pass
+        self.thread.join(timeout)
+        self.thread = None
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # starts a new game with the given (or a random) seed and waits until its first state has been published.
+    # anything still in the queues from the previous game is dropped. returns whether the new game started: False
+    # if the engine stopped (its loop can stop at any time, e.g. when the gui window is closed) or timeout seconds
+    # passed first, the restart may then never happen
+    def restart(self, seed=None, timeout=None):
+        if not self.running():
+            return False
+        if self.controller is None:  # a fresh first game is still being set up
+            return True
+        started = threading.Event()
+        done = threading.Event()
+
+        def restart():
+            try:
+                self.controller.restart(seed)
+                started.set()
+            finally:
+                done.set()
+
+        try:
+            self.secondary_event_loop.call_soon_threadsafe(restart)
+        except RuntimeError:  # the loop closed since running() was checked
+            return False
+        deadline = None if timeout is None else perf_counter() + timeout
+        # a loop that stops before getting to the callback never runs it, so it is waited for in slices
+        while not done.wait(self.RESTART_POLL_INTERVAL):
+            if not self.running() or (deadline is not None and perf_counter() >= deadline):
+                return started.is_set()
+        return started.is_set()
 
     # a one-time use method that will create a gui after the game has already started if it doesn't have one
-    # returns the queue object that
+    # returns the mailbox the gui reads from
     def create_gui(self):
         if self.has_out_view:
             return
 
         self.has_out_view = True
-        self.v_out_queue = queue.Queue()
-        GuiThread(self.v_out_queue, self.c_queue, self.secondary_event_loop, self.game_width, self.game_height)
+        self.v_out_queue = LatestMailbox()
+        self.gui = GuiThread(self.v_out_queue, self.c_queue, self.secondary_event_loop, self.game_width,
+                             self.game_height)
         return self.v_out_queue
 
 
@@ -1,2 +1,4 @@
 from snake_impl.util.periodic import Periodic
+from snake_impl.util.mailbox import LatestMailbox
+from snake_impl.util.transposition import TranspositionTable
 import snake_impl.util.QueueUtil
@@ -0,0 +1,62 @@
+import queue
+import threading
+
+
+# a one slot queue that only keeps the newest item. put never blocks and overwrites whatever the reader hasn't
+# picked up yet, so a slow reader (e.g. a view redrawing at 60 fps) can't hold back or pile up behind a fast writer.
+# overwritten items are counted in dropped. get/empty/put match queue.Queue so it can stand in for one
+class LatestMailbox:
+    def __init__(self):
+        self._item = None
+        self._full = False
+        self._ready = threading.Condition(threading.Lock())
+        self.posted = 0  # items put in
+        self.delivered = 0  # items taken out
+        self.dropped = 0  # items overwritten before anyone took them
+
+    def put(self, item, block=True, timeout=None):
+        with self._ready:
+            if self._full:
+                self.dropped += 1
+            self._item = item
+            self._full = True
+            self.posted += 1
+            self._ready.notify()
+
+    def put_nowait(self, item):
+        self.put(item)
+
+    # waits for an item unless block is False, raises queue.Empty like Queue.get if there is none
+    def get(self, block=True, timeout=None):
+        with self._ready:
+            if block and not self._ready.wait_for(lambda: self._full, timeout):
+                raise queue.Empty()
+            if not self._full:
+                raise queue.Empty()
+            return self._take()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    # the newest item if one came in since the last take, otherwise None. never blocks
+    def get_latest(self):
+        with self._ready:
+            return self._take() if self._full else None
+
+    def _take(self):
+        item, self._item, self._full = self._item, None, False
+        self.delivered += 1
+        return item
+
+    def empty(self):
+        return not self._full
+
+    def qsize(self):
+        return int(self._full)
+
+    # nothing to account for, every take completes the item. kept so code written for Queue keeps working
+    def task_done(self):
+        pass
+
+    def stats(self):
+        return {'posted': self.posted, 'delivered': self.delivered, 'dropped': self.dropped}
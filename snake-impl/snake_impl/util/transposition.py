@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+
+# bounded cache keyed on Game.state_hash, e.g. for a planner memoizing the value of states it has already searched
+# or a replay buffer skipping transitions it already holds. the least recently used entry is evicted once max_size
+# entries are stored. a 64 bit hash can in principle collide, store something checkable in the value if that matters
+class TranspositionTable:
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, state_hash, default=None):
+        value = self.entries.get(state_hash, self)
+        if value is self:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(state_hash)
+        return value
+
+    def put(self, state_hash, value):
+        self.entries[state_hash] = value
+        self.entries.move_to_end(state_hash)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    # stores compute(state_hash) unless it's already cached, returns the cached value either way
+    def lookup(self, state_hash, compute):
+        value = self.get(state_hash, self)
+        if value is self:
+            value = compute(state_hash)
+            self.put(state_hash, value)
+        return value
+
+    # marks state_hash as seen and tells whether it had been seen before, for deduplication
+    def seen(self, state_hash):
+        if self.get(state_hash, self) is self:
+            self.put(state_hash, True)
+            return False
+        return True
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def __contains__(self, state_hash):
+        return state_hash in self.entries
+
+    def __len__(self):
+        return len(self.entries)
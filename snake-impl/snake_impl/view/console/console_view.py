@@ -10,6 +10,9 @@ class ConsoleView(GameView):
         self.controller = controller
         self._console_listener = Periodic(self.trigger_console_inputs, 0.01)
 
+    def refresh(self, game):
+        self.update(game)
+
     def update(self, game):
         print()
         for y in range(game.height):
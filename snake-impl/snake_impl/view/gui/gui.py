@@ -3,10 +3,11 @@ import asyncio
 
 
 class Gui(tkinter.Tk):
+    # closing the window ends the game too. the window itself is destroyed once the main loop returns (see GuiThread)
     def on_close(self, game_loop):
         self.quit()
-        self.destroy()
-        game_loop.stop()
+        if not game_loop.is_closed():
+            game_loop.call_soon_threadsafe(game_loop.stop)  # the game loop runs on another thread
 
     def __init__(self, game_loop):
         super().__init__()
@@ -1,21 +1,44 @@
 import threading
+import tkinter
 from snake_impl.view.gui.gui import Gui
 from snake_impl.view.gui.gui_view import GuiView
 
 
+# runs the gui's tk main loop. it's a daemon so an open window never keeps the process alive, stop() closes it
 class GuiThread(threading.Thread):
+    stop_poll_millis = 100
+
     # game width and height in cells, not actual px
     def __init__(self, view_queue, controller_queue, game_loop, game_width, game_height):
-        threading.Thread.__init__(self)
+        threading.Thread.__init__(self, name='snake-gui', daemon=True)
         self.view_queue = view_queue
         self.controller_queue = controller_queue
         self.game_width = game_width
         self.game_height = game_height
         self.game_loop = game_loop
+        self.stop_event = threading.Event()
         self.start()
 
     def run(self):
         gui = Gui(self.game_loop)
         view = GuiView(gui, self.view_queue, self.controller_queue, self.game_width, self.game_height)
         view.enter_view_refresh_loop()
+        self.poll_stop(gui)
         gui.mainloop()
+        # tk objects belong to the thread that made them, so the window is torn down here and not in stop()
+        try:
+            gui.destroy()
+        except tkinter.TclError:  # already gone
+            pass
+
+    def poll_stop(self, gui):
+        if self.stop_event.is_set():
+            gui.quit()
+        else:
+            gui.after(self.stop_poll_millis, self.poll_stop, gui)
+
+    # closes the window and waits for the thread to finish, from any thread
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if threading.current_thread() is not self:
+            self.join(timeout)
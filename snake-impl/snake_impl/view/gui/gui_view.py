@@ -6,17 +6,18 @@ from snake_impl.config import Config as Cfg
 from snake_impl.view.game_view import GameView
 
 
-def game_info_string(model, fps):
+def game_info_string(model, fps, dropped=0):
     return """Score: %d
 Length: %d
 Food eaten: %d
 Time survived: %.2f seconds
-FPS: %.2f""" % (model.score,
+FPS: %.2f
+Frames skipped: %d""" % (model.score,
                 len(model.segments),
                 model.food_eaten,
                 time() - model.game_start_time if model.started() and not model.ended() else model.last_update_time -
                                                                                              model.game_start_time,
-                fps)
+                fps, dropped)
 
 
 class GuiView(GameView, Canvas):
@@ -76,21 +77,17 @@ class GuiView(GameView, Canvas):
     def enter_view_refresh_loop(self):
         self.after(int(Cfg.graphics.screen_update_millis), self.enter_view_refresh_loop)  # update again
 
-        update_message = None
-        count = 0
-        while not self.view_queue.empty():
-            count += 1
-            update_message = self.view_queue.get()
-        if count > 0:
+        # only the newest state is drawn, the ones that came in since the last refresh were coalesced by the mailbox
+        update_message = self.view_queue.get_latest()
+        if update_message is not None:
             self.last_state = update_message.payload
             # print('\tdraw after:', time() - update_message.creation_time)
             self.refresh(self.last_state)  # perform the draw associated with the task
-            for _ in range(count):  # finalize each of the updates
-                self.view_queue.task_done()
         if self.palette.text.info.show:
             self.update_fps()
             self.delete("info_text")
-            self.create_outlined_text(20, 20, text=game_info_string(self.last_state, self.fps),
+            info = game_info_string(self.last_state, self.fps, self.view_queue.dropped)
+            self.create_outlined_text(20, 20, text=info,
                                       outline_color=self.palette.text.info.outline_color, offset=1,
                                       anchor="nw", font=('Arial', 16), fill=self.palette.text.info.main_color,
                                       tags="info_text")
@@ -131,10 +128,10 @@ class GuiView(GameView, Canvas):
 
         if game.ended():
             self.fps_list.clear()
-            if game.lost():
+            if game.lost() or game.truncated():
                 self.create_outlined_text(self.canvas_width / 2, self.canvas_height / 2,
                                           outline_color=self.palette.text.game_over.outline_color, offset=1,
-                                          anchor='center', text='Game Over',
+                                          anchor='center', text='Game Over' if game.lost() else 'Out of Time',
                                           font=('Arial', 36), fill=self.palette.text.game_over.main_color, tags="text")
             else:  # game won
                 self.create_outlined_text(self.canvas_width / 2, self.canvas_height / 2,
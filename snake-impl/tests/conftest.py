@@ -0,0 +1,5 @@
+import os
+import sys
+
+# lets the tests run from a checkout without installing snake_impl
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,159 @@
+import os
+import socket
+import struct
+import tempfile
+
+import numpy as np
+import pytest
+
+from snake_impl.expert import ExpertPolicy
+from snake_impl.headless import HeadlessSnake
+from snake_impl.replay import EpisodeLog, EpisodeReplayer
+from snake_impl.model.game import Game
+from snake_impl.server import SnakeServer, SnakeClient, ProtocolError, parse_address
+import snake_impl.server.protocol as protocol
+
+
+def test_request_round_trip():
+    for opcode in (protocol.RESET, protocol.STEP, protocol.STATE, protocol.CLOSE):
+        request = protocol.pack_request(opcode, [3, 0, 2 ** 32 - 1], b'payload')
+        unpacked_opcode, ids, payload = protocol.unpack_request(request)
+        assert unpacked_opcode == opcode and list(ids) == [3, 0, 2 ** 32 - 1] and payload == b'payload'
+
+    opcode, ids, payload = protocol.unpack_request(protocol.pack_request(protocol.STATE))
+    assert opcode == protocol.STATE and len(ids) == 0 and payload == b''
+
+
+def test_create_round_trip():
+    opcode, count, payload = protocol.unpack_request(protocol.pack_create_request(5, 8, 6, 1000, 2.5))
+    assert (opcode, count) == (protocol.CREATE, 5)
+    assert protocol.unpack_create(payload) == (8, 6, 1000, 2.5)
+    _, _, payload = protocol.unpack_request(protocol.pack_create_request(1, 10, 10))
+    assert protocol.unpack_create(payload) == (10, 10, None, None)
+
+
+def test_payload_round_trips():
+    assert protocol.unpack_ids(protocol.pack_ids([7, 1, 4])) == [7, 1, 4]
+    seeds = [0, None, 2 ** 64 - 2, 12345]
+    assert protocol.unpack_seeds(protocol.pack_seeds(seeds), len(seeds)) == seeds
+    assert list(protocol.unpack_actions(protocol.pack_actions([0, 3, 1, 2]), 4)) == [0, 3, 1, 2]
+
+
+def test_ok_and_error_responses():
+    assert protocol.unpack_response(protocol.pack_ok(b'abc')) == b'abc'
+    assert protocol.unpack_response(protocol.pack_ok()) == b''
+    with pytest.raises(ProtocolError, match='KeyError: no such game'):
+        protocol.unpack_response(protocol.pack_error('KeyError: no such game'))
+
+
+def assert_same_game(snapshot, game):
+    assert snapshot.segments is not game.segments
+    np.testing.assert_array_equal(np.array(snapshot.segments), np.array(game.segments))
+    for field in ('score', 'state', 'ticks', 'food_eaten', 'growth_queued', 'state_hash', 'truncation_reason'):
+        assert getattr(snapshot, field) == getattr(game, field), field
+    np.testing.assert_array_equal(snapshot.dir, game.dir)
+    if game.food_pos is None:
+        assert snapshot.food_pos is None
+    else:
+        np.testing.assert_array_equal(snapshot.food_pos, game.food_pos)
+    np.testing.assert_array_equal(snapshot.action_mask(), game.action_mask())
+
+
+def test_state_round_trip():
+    engines = [HeadlessSnake(6, 5, max_ticks=40), HeadlessSnake(6, 5, starvation_factor=0.5), HeadlessSnake(6, 5)]
+    rng = np.random.default_rng(0)
+    for seed, engine in enumerate(engines):
+        engine.reset(seed)
+    for _ in range(60):
+        for engine in engines:
+            if not engine.game.ended():
+                mask = engine.game.action_mask()
+                engine.step(Game.ACTIONS[rng.choice(np.flatnonzero(mask) if mask.any() else np.arange(4))])
+        games = [engine.game for engine in engines]
+        for snapshot, game in zip(protocol.unpack_states(protocol.pack_states(games), 6, 5), games):
+            assert_same_game(snapshot, game)
+    assert [engine.game.truncation_reason for engine in engines] == ['max_ticks', 'starvation', None]
+    assert protocol.unpack_states(b'', 6, 5) == []
+
+
+def test_won_game_without_food_round_trips():
+    engine = HeadlessSnake(4, 4)
+    engine.reset(0)
+    expert = ExpertPolicy(4, 4)
+    while not engine.game.ended():
+        engine.step(Game.ACTIONS[expert.act(engine.game)])
+    game = engine.game
+    assert game.won() and game.food_pos is None
+    assert_same_game(protocol.unpack_states(protocol.pack_states([game]), 4, 4)[0], game)
+
+
+def test_log_round_trip():
+    engines = [HeadlessSnake(6, 5, max_ticks=30), HeadlessSnake(4, 4)]
+    for seed, engine in enumerate(engines):
+        engine.reset(seed)
+        for action in [0, 2, 2, 1, 3][:seed + 3]:
+            engine.step(Game.ACTIONS[action])
+    logs = [EpisodeLog.from_controller(engine.controller) for engine in engines]
+    unpacked = protocol.unpack_logs(protocol.pack_logs(logs))
+    assert [log.to_bytes() for log in unpacked] == [log.to_bytes() for log in logs]
+    assert protocol.unpack_logs(b'') == []
+
+
+def test_framing():
+    left, right = socket.socketpair()
+    with left, right:
+        protocol.send_message(left, b'')
+        protocol.send_message(left, b'x' * 100000)  # more than one recv's worth
+        assert protocol.recv_message(right) == b''
+        assert protocol.recv_message(right) == b'x' * 100000
+
+        left.sendall(struct.pack('<I', 10) + b'short')
+        left.shutdown(socket.SHUT_WR)
+        with pytest.raises(ProtocolError):
+            protocol.recv_message(right)
+
+    left, right = socket.socketpair()
+    with right:
+        left.close()
+        assert protocol.recv_message(right) is None
+
+
+def test_parse_address():
+    assert parse_address('example.org:5555') == ('example.org', 5555)
+    assert parse_address(':80') == ('localhost', 80)
+    assert parse_address('unix:/tmp/snake.sock') == '/tmp/snake.sock'
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='needs Unix domain sockets')
+def test_server_round_trip():
+    path = os.path.join(tempfile.mkdtemp(), 'snake.sock')
+    server = SnakeServer(path).start()
+    client = SnakeClient(server.address)
+    try:
+        ids = client.create(2, 5, 5)
+        local = [HeadlessSnake(5, 5) for _ in ids]
+        for seed, (game_id, engine) in enumerate(zip(ids, local)):
+            engine.reset(seed)
+        remote = client.reset(ids, 5, 5, seeds=[0, 1])
+        for _ in range(20):
+            for snapshot, engine in zip(remote, local):
+                assert_same_game(snapshot, engine.game)
+            if any(engine.game.ended() for engine in local):
+                break
+            remote = client.step(ids, [2, 3], 5, 5)
+            for engine, action in zip(local, [2, 3]):
+                engine.step(Game.ACTIONS[action])
+
+        logs = client.logs(ids)
+        for log, engine in zip(logs, local):
+            assert log.to_bytes() == EpisodeLog.from_controller(engine.controller).to_bytes()
+            assert EpisodeReplayer(log).verify()
+
+        client.close_games(ids[:1])
+        with pytest.raises(ProtocolError, match='No game with id'):
+            client.state(ids[:1], 5, 5)
+        assert len(client.state(ids[1:], 5, 5)) == 1  # the connection is still usable after an error
+    finally:
+        client.close()
+        server.shutdown()
+    assert not os.path.exists(path)
@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pytest
+
+from snake_impl.expert import ExpertPolicy
+from snake_impl.headless import HeadlessSnake
+from snake_impl.model.game import Game
+from snake_impl.model.game import State as GameState
+from snake_impl.replay import EpisodeLog, EpisodeReplayer, read_archive, verify_archive, write_archive
+
+# regression inputs for changes to GameController.tick, rewritten from snake-impl with `python -m tests.test_replay`.
+# if a change to the controller breaks these the game plays differently than it used to, which a performance change
+# must not do. only rewrite them for a deliberate change to the rules
+GOLDEN_ARCHIVE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'golden_episodes.snkl.gz')
+
+
+# plays one seeded game to the end, returns its log and the state hash after every tick (the initial state first)
+def play(seed, width=6, height=6, max_ticks=None, starvation_factor=None, policy='expert'):
+    engine = HeadlessSnake(width, height, max_ticks, starvation_factor)
+    engine.reset(seed)
+    rng = np.random.default_rng(seed)
+    expert = ExpertPolicy(width, height)
+    hashes = [engine.game.state_hash]
+    while not engine.game.ended():
+        if policy == 'expert':
+            action = expert.act(engine.game)
+        elif policy == 'safe':
+            mask = engine.game.action_mask()
+            action = rng.choice(np.flatnonzero(mask)) if mask.any() else 0
+        else:
+            action = rng.integers(len(Game.ACTIONS))
+        engine.step(Game.ACTIONS[action])
+        hashes.append(engine.game.state_hash)
+    return EpisodeLog.from_controller(engine.controller), hashes
+
+
+def episodes():
+    return [play(0), play(1, max_ticks=40, policy='safe'), play(2, 8, 5, policy='random'),
+            play(3, 8, 8, starvation_factor=0.5, policy='safe')]
+
+
+def test_episodes_cover_eating_truncation_and_death():
+    logs = [log for log, _ in episodes()]
+    assert logs[0].state == GameState.WON and logs[0].food_eaten > 0
+    assert logs[1].state == GameState.TRUNCATED and logs[1].ticks == 40
+    assert logs[2].state == GameState.LOST
+    assert logs[3].state == GameState.TRUNCATED and logs[3].ticks < 200
+
+
+def assert_same_log(a, b):
+    for field in ('width', 'height', 'seed', 'actions', 'max_ticks', 'starvation_factor', 'score', 'food_eaten',
+                  'ticks', 'state', 'rules'):
+        assert getattr(a, field) == getattr(b, field), field
+
+
+def test_bytes_and_archive_round_trip(tmp_path):
+    logs = [log for log, _ in episodes()]
+    for log in logs:
+        assert_same_log(EpisodeLog.from_bytes(log.to_bytes()), log)
+
+    for name in ('episodes.snkl', 'episodes.snkl.gz'):
+        path = str(tmp_path / name)
+        write_archive(path, logs[:2], append=False)
+        write_archive(path, logs[2:])
+        read = list(read_archive(path))
+        assert len(read) == len(logs)
+        for a, b in zip(read, logs):
+            assert_same_log(a, b)
+        assert verify_archive(path) == 0
+
+
+def test_replay_verifies_and_seeks():
+    for log, hashes in episodes():
+        replayer = EpisodeReplayer(log)
+        assert replayer.verify()
+        assert [game.state_hash for game in replayer.states()] == hashes
+        last = len(log)
+        for k in (last // 2, last, 1, 0, last - 1):  # forwards and backwards
+            assert replayer.seek(k).state_hash == hashes[k]
+            assert replayer.position == k
+
+
+def test_replay_detects_a_changed_outcome():
+    log, _ = play(1, max_ticks=40, policy='safe')
+    log.score += 1
+    assert not EpisodeReplayer(log).verify()
+
+
+def test_rules_mismatch():
+    log, _ = play(0)
+    log.rules = log.rules._replace(growth_rate=log.rules.growth_rate + 1, food_score=log.rules.food_score + 5)
+    with pytest.raises(ValueError, match='growth_rate'):
+        EpisodeReplayer(EpisodeLog.from_bytes(log.to_bytes()))
+
+
+def test_bad_version():
+    data = bytearray(play(0)[0].to_bytes())
+    data[4] = 1
+    with pytest.raises(ValueError):
+        EpisodeLog.from_bytes(bytes(data))
+
+
+def test_golden_archive():
+    logs = list(read_archive(GOLDEN_ARCHIVE))
+    assert len(logs) == 4
+    assert verify_archive(GOLDEN_ARCHIVE) == 0
+
+
+def record_golden_archive(path=GOLDEN_ARCHIVE):
+    write_archive(path, [log for log, _ in episodes()], append=False)
+
+
+if __name__ == '__main__':
+    record_golden_archive()
@@ -0,0 +1,75 @@
+import threading
+import types
+from time import perf_counter, sleep
+
+from snake_impl.engine_pool import EnginePool
+from snake_impl.snake import Snake
+
+
+def started_engine():
+    engine = Snake(out_view=False, width=6, height=6)
+    engine.start()
+    deadline = perf_counter() + 5
+    while engine.controller is None and perf_counter() < deadline:
+        sleep(0.01)
+    assert engine.controller is not None
+    return engine
+
+
+def test_restart_of_running_engine():
+    engine = started_engine()
+    try:
+        assert engine.restart(seed=1)
+        assert engine.controller.game.seed == 1
+    finally:
+        engine.stop(5)
+
+
+def test_restart_of_stopped_engine():
+    engine = started_engine()
+    engine.stop(5)
+    assert not engine.restart()
+
+    # closing the gui stops the loop from its own thread, stop() is never called
+    engine = started_engine()
+    loop = engine.secondary_event_loop
+    loop.call_soon_threadsafe(loop.stop)
+    engine.thread.join(5)
+    assert not engine.restart()
+    engine.stop(5)
+
+
+def test_restart_does_not_hang_when_loop_stops_first():
+    engine = started_engine()
+    loop = engine.secondary_event_loop
+    # the loop stops with the restart still queued, so it never runs
+    engine.secondary_event_loop = types.SimpleNamespace(call_soon_threadsafe=lambda callback: None)
+    threading.Timer(0.2, loop.call_soon_threadsafe, args=(loop.stop,)).start()
+    start = perf_counter()
+    assert not engine.restart()
+    assert perf_counter() - start < 5
+    engine.secondary_event_loop = loop
+    engine.stop(5)
+
+
+def test_restart_timeout():
+    engine = started_engine()
+    loop = engine.secondary_event_loop
+    engine.secondary_event_loop = types.SimpleNamespace(call_soon_threadsafe=lambda callback: None)
+    assert not engine.restart(timeout=0.2)
+    engine.secondary_event_loop = loop
+    engine.stop(5)
+
+
+def test_pool_stops_engines_that_cannot_restart():
+    pool = EnginePool()
+    engine = pool.acquire(width=6, height=6, out_view=False)
+    other = pool.acquire(width=6, height=6, out_view=False)
+    other.stop(5)
+    pool.release(engine)
+    pool.release(other)
+    assert pool.stats()['idle'] == 1 and pool.stats()['stopped'] == 1
+    assert pool.acquire(width=6, height=6, out_view=False) is engine
+    pool.release(engine)
+    pool.close()
+    assert not engine.running()
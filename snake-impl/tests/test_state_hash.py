@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from snake_impl.expert import ExpertPolicy
+from snake_impl.headless import HeadlessSnake
+from snake_impl.model.game import Game
+from snake_impl.util import TranspositionTable
+
+
+def assert_hash_tracks_the_game(width, height, seed, policy):
+    engine = HeadlessSnake(width, height, max_ticks=2000)
+    engine.reset(seed)
+    expert = ExpertPolicy(width, height)
+    rng = np.random.default_rng(seed)
+    game = engine.game
+    assert game.state_hash == game.compute_hash()
+    while not game.ended():
+        if policy == 'expert':
+            action = expert.act(game)
+        else:
+            mask = game.action_mask()
+            action = rng.choice(np.flatnonzero(mask)) if mask.any() else rng.integers(4)
+        game = engine.step(Game.ACTIONS[action])
+        assert game.state_hash == game.compute_hash(), game.ticks
+    return game
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_hash_matches_random_play(seed):
+    assert_hash_tracks_the_game(7, 5, seed, 'random')
+
+
+def test_incremental_hash_matches_expert_play():
+    game = assert_hash_tracks_the_game(6, 6, 0, 'expert')
+    assert game.won() and len(game.segments) == 36
+
+
+# a game on a 5x5 board with the given segments (head first), food, direction and queued growth
+def board(segments, food=(4, 4), direction=Game.DIR_MAP['RIGHT'], growth=0):
+    game = Game(5, 5, seed=0)
+    while game.segments:
+        game.pop_tail()
+    for cell in reversed(segments):
+        game.push_head(np.array(cell))
+    game.food_pos = np.array(food) if food is not None else None
+    game.dir = direction
+    game.growth_queued = growth
+    assert game.state_hash == game.compute_hash()
+    return game
+
+
+def test_hash_tells_boards_apart():
+    snake = [(2, 2), (1, 2), (1, 1), (2, 1)]
+    base = board(snake)
+    assert board(snake).state_hash == base.state_hash
+    variants = [board(snake[::-1]),  # same cells, head and tail swapped
+                board([(2, 1), (2, 2), (1, 2), (1, 1)]),  # same cells, the loop walked from elsewhere
+                board(snake, food=(0, 0)),
+                board(snake, food=None),
+                board(snake, direction=Game.DIR_MAP['UP']),
+                board(snake, growth=2)]
+    hashes = {game.state_hash for game in variants}
+    assert len(hashes) == len(variants) and base.state_hash not in hashes
+
+
+def test_transposition_table_evicts_least_recently_used():
+    table = TranspositionTable(max_size=2)
+    table.put(1, 'a')
+    table.put(2, 'b')
+    assert table.get(1) == 'a'  # 2 is now the least recently used
+    table.put(3, 'c')
+    assert 2 not in table and 1 in table and 3 in table and len(table) == 2
+    assert table.get(2, 'missing') == 'missing'
+    assert (table.hits, table.misses) == (1, 1)
+
+    computed = []
+    assert table.lookup(4, lambda h: computed.append(h) or h * 10) == 40
+    assert table.lookup(4, lambda h: computed.append(h) or h * 10) == 40
+    assert computed == [4] and 1 not in table  # 1 went out to make room for 4
+
+    table.clear()
+    assert len(table) == 0 and (table.hits, table.misses) == (0, 0)
+
+
+def test_transposition_table_seen():
+    table = TranspositionTable(max_size=2)
+    assert not table.seen(10)
+    assert table.seen(10)
+    assert not table.seen(20)
+    assert not table.seen(30)  # evicts 10
+    assert not table.seen(10)
+    assert table.seen(30)
+
+
+def test_seen_deduplicates_game_states():
+    engine = HeadlessSnake(5, 5)
+    engine.reset(0)
+    table = TranspositionTable()
+    assert not table.seen(engine.game.state_hash)
+    assert table.seen(engine.reset(0).state_hash)  # the same seed starts the same board